@@ -1,5 +1,60 @@
+import argparse
+import copy
+import struct
+from array import array
+from collections import OrderedDict
+
+# Control lines in CON order; control_word() packs them with Cp as the top bit
+CONTROL_SIGNALS = ('Cp', 'Ep', 'Lm', 'Ce', 'Li', 'Ei', 'La', 'Ea', 'Su', 'Eu', 'Lb', 'Lo')
+
+# Hook events; every callback is called as callback(simulator)
+HOOK_EVENTS = ('before_tstate', 'after_tstate', 'before_instruction', 'after_instruction')
+
+# T-states per opcode with the ring counter running to T6 (HLT stops the
+# clock after T4; undefined opcodes and NOP end after the T3 decode)
+TSTATES = {0x1: 6, 0x2: 6, 0x3: 6, 0xE: 6, 0xF: 4}
+
+# T-states per opcode when the ring counter resets after the last useful one
+# (undefined opcodes and NOP end after the T3 decode either way)
+EARLY_RESET_TSTATES = {0x1: 5, 0x2: 6, 0x3: 6, 0xE: 4, 0xF: 4}
+
+# Memory images whose trace (or failure to compile) each simulator remembers,
+# least recently used dropped first
+JIT_CACHE_SIZE = 64
+
+
 class SAP1Simulator:
-    def __init__(self, interactive=True):
+    # Fixed attribute set: no per-instance dict, and reset() reuses the instance
+    __slots__ = ('PC', 'MAR', 'ACC', 'IR', 'TMP', 'OUT',
+                 'memory_size', 'memory', 'address_bits', 'address_mask',
+                 'instruction_bytes', 'address_digits', 'ir_digits',
+                 'control_signals', 't_state', 'last_alu_result',
+                 'verbose', 'mode', 'stop_reason', 'loop_info', 'early_reset', 'clock_cycles',
+                 'fetch_counts', 'read_counts',
+                 'jit', 'jit_threshold', 'jit_max_trace', 'jit_batch', 'jit_cache', 'hooks')
+
+    # Instruction set, shared by every instance
+    instructions = {
+        0x0: 'NOP',
+        0x1: 'LDA',
+        0x2: 'ADD',
+        0x3: 'SUB',
+        0xE: 'OUT',
+        0xF: 'HLT'
+    }
+
+    # Opcode mapping for user input
+    opcode_map = {'LDA': 0x1, 'ADD': 0x2, 'SUB': 0x3, 'OUT': 0xE, 'HLT': 0xF}
+
+    # Set on the generated hooked subclasses to the class they extend
+    hook_base = None
+
+    def __init__(self, interactive=True, memory_size=16, verbose=True, mode='cycle',
+                 jit=False, jit_threshold=2, jit_max_trace=256, jit_batch=4096, early_reset=False,
+                 count_accesses=False):
+        if not 16 <= memory_size <= 0x10000 or memory_size & (memory_size - 1):
+            raise ValueError("memory_size must be a power of two from 16 to 65536 bytes")
+
         # Initialize registers
         self.PC = 0
         self.MAR = 0
@@ -7,7 +62,18 @@ class SAP1Simulator:
         self.IR = 0
         self.TMP = 0
         self.OUT = 0
-        self.memory = [0] * 16
+
+        # Memory is a flat byte array; the address field grows with its size
+        self.memory_size = memory_size
+        self.memory = bytearray(memory_size)
+        self.address_bits = (memory_size - 1).bit_length()
+        self.address_mask = memory_size - 1
+
+        # Instruction word = 4-bit opcode above the address field, stored big-endian.
+        # 16 bytes of memory gives the classic one-byte SAP-1 encoding.
+        self.instruction_bytes = (4 + self.address_bits + 7) // 8
+        self.address_digits = max(2, (self.address_bits + 3) // 4)
+        self.ir_digits = 2 * self.instruction_bytes
         
         # Control signals
         self.control_signals = {
@@ -17,19 +83,37 @@ class SAP1Simulator:
         
         self.t_state = 0
         self.last_alu_result = None
-        
-        # Instruction set
-        self.instructions = {
-            0x0: 'NOP',
-            0x1: 'LDA',
-            0x2: 'ADD',
-            0x3: 'SUB',
-            0xE: 'OUT',
-            0xF: 'HLT'
-        }
-        
-        # Opcode mapping for user input
-        self.opcode_map = {'LDA': 0x1, 'ADD': 0x2, 'SUB': 0x3, 'OUT': 0xE, 'HLT': 0xF}
+
+        # verbose=False silences the per-T-state trace and run() report for batch use
+        self.verbose = verbose
+        self.set_mode(mode)
+        self.stop_reason = None
+        self.loop_info = None
+
+        # Trace JIT for programs that wrap around memory without halting:
+        # after jit_threshold interpreted PC cycles, whole cycles run as one
+        # generated function (traces longer than jit_max_trace instructions
+        # are not compiled; jit_batch cycles run per call when uncapped)
+        self.jit = jit
+        self.jit_threshold = jit_threshold
+        self.jit_max_trace = jit_max_trace
+        self.jit_batch = jit_batch
+
+        # Early reset ends LDA after T5 and OUT after T4 instead of idling to T6;
+        # run() then counts clock cycles (None when it did not count them)
+        self.early_reset = early_reset
+        self.clock_cycles = None
+        self.jit_cache = OrderedDict()
+
+        # Per-cell access counters when count_accesses is set: instruction fetches
+        # (T2) and operand reads (T5). The ISA has no store, so nothing else
+        # touches memory. None when not counting, so the step paths skip them.
+        self.fetch_counts = self.read_counts = None
+        if count_accesses:
+            self.fetch_counts = array('Q', bytes(8 * memory_size))
+            self.read_counts = array('Q', bytes(8 * memory_size))
+
+        self.hooks = {event: [] for event in HOOK_EVENTS}
         
         if interactive:
             self.initialize_memory_with_user_input()
@@ -45,12 +129,12 @@ class SAP1Simulator:
         data_values = {}
         address_counter = 0
 
-        while address_counter < 16:
-            user_input = input(f"Address {address_counter:02X}: ").strip().upper()
+        while address_counter < self.memory_size:
+            user_input = input(f"Address {address_counter:0{self.address_digits}X}: ").strip().upper()
             if user_input == 'DONE':
                 break
             if not user_input:
-                address_counter += 1
+                address_counter += self.instruction_bytes
                 continue
 
             parts = user_input.split()
@@ -58,14 +142,14 @@ class SAP1Simulator:
 
             if instruction in ('LDA', 'ADD', 'SUB') and len(parts) == 2:
                 try:
-                    addr = int(parts[1], 0) & 0x0F  # Mask to 4 bits
+                    addr = int(parts[1], 0) & self.address_mask  # Mask to address width
                     program.append((instruction, addr, address_counter))
-                    address_counter += 1
+                    address_counter += self.instruction_bytes
                 except ValueError:
                     print("Invalid address. Use decimal or hex (0xNN).")
             elif instruction in ('OUT', 'HLT'):
                 program.append((instruction, None, address_counter))
-                address_counter += 1
+                address_counter += self.instruction_bytes
             else:
                 print("Invalid instruction. Use: LDA addr, ADD addr, SUB addr, OUT, HLT")
 
@@ -78,7 +162,7 @@ class SAP1Simulator:
             parts = user_input.split()
             if len(parts) == 2:
                 try:
-                    addr = int(parts[0], 0) & 0x0F  # Mask to 4 bits
+                    addr = int(parts[0], 0) & self.address_mask  # Mask to address width
                     value = int(parts[1], 0) & 0xFF  # Mask to 8 bits
                     data_values[addr] = value
                 except ValueError:
@@ -91,41 +175,108 @@ class SAP1Simulator:
     def initialize_memory_with_user_input(self):
         """Load user program into memory"""
         program, data_values = self.get_user_input()
-        self.memory = [0] * 16
+        self.memory[:] = bytes(self.memory_size)
 
         # Load program instructions
         for instruction, addr, mem_addr in program:
-            if instruction in ['LDA', 'ADD', 'SUB']:
-                opcode = self.opcode_map[instruction]
-                self.memory[mem_addr] = (opcode << 4) | addr
-            else:
-                self.memory[mem_addr] = self.opcode_map[instruction] << 4
+            self.write_word(mem_addr, self.encode_instruction(instruction, addr))
 
         # Load data values
         for addr, value in data_values.items():
             self.memory[addr] = value
 
+    def load_image(self, image):
+        """Replace memory with a raw image (bytes or a list of 8-bit values)"""
+        if len(image) > self.memory_size:
+            raise ValueError(f"image is {len(image)} bytes but memory holds {self.memory_size}")
+        self.memory[:] = bytes(self.memory_size)
+        self.memory[:len(image)] = bytes(image)
+
+    def reset(self, image=None):
+        """Return to the power-on state in place, loading image when given (else keeping memory)"""
+        self.PC = self.MAR = self.ACC = self.IR = self.TMP = self.OUT = 0
+        self.jit_cache.clear()
+        for signal in self.control_signals:
+            self.control_signals[signal] = 0
+        self.t_state = 0
+        self.last_alu_result = None
+        self.stop_reason = None
+        self.loop_info = None
+        self.clock_cycles = None
+        self.clear_access_counts()
+        if image is not None:
+            self.load_image(image)
+
+    def memory_view(self):
+        """Read-only zero-copy view of memory for tracers and the GUI"""
+        return memoryview(self.memory).toreadonly()
+
+    def clear_access_counts(self):
+        """Zero the per-cell access counters in place"""
+        if self.fetch_counts is not None:
+            zeros = array('Q', bytes(8 * self.memory_size))
+            self.fetch_counts[:] = zeros
+            self.read_counts[:] = zeros
+
+    def tstate_table(self):
+        """T-states each opcode takes on this machine, indexed by opcode over the whole instruction word"""
+        table = EARLY_RESET_TSTATES if self.early_reset else TSTATES
+        return [table.get(opcode, 3) for opcode in range(1 << (8 * self.instruction_bytes - self.address_bits))]
+
+    def count_fetch(self, address):
+        """Count a fetch of the instruction word starting at address"""
+        counts = self.fetch_counts
+        for i in range(self.instruction_bytes):
+            counts[(address + i) & self.address_mask] += 1
+
+    def encode_instruction(self, instruction, addr=None):
+        """Build the instruction word for a mnemonic and optional operand address"""
+        return (self.opcode_map[instruction] << self.address_bits) | ((addr or 0) & self.address_mask)
+
+    def read_word(self, addr):
+        """Read an instruction word starting at addr, wrapping at the end of memory"""
+        word = 0
+        for i in range(self.instruction_bytes):
+            word = (word << 8) | self.memory[(addr + i) & self.address_mask]
+        return word
+
+    def write_word(self, addr, word):
+        """Store an instruction word big-endian starting at addr"""
+        for i in reversed(range(self.instruction_bytes)):
+            self.memory[(addr + i) & self.address_mask] = word & 0xFF
+            word >>= 8
+
     def reset_control_signals(self):
         """Turn off all control signals"""
         for signal in self.control_signals:
             self.control_signals[signal] = 0
         self.last_alu_result = None
 
+    def control_word(self):
+        """Current control signals as a 12-bit word (Cp is bit 11, Lo is bit 0)"""
+        word = 0
+        for signal in CONTROL_SIGNALS:
+            word = (word << 1) | self.control_signals[signal]
+        return word
+
     def print_control_sequence(self):
         """Display the current control sequence in CON format"""
-        signals = ['Cp', 'Ep', 'Lm', 'Ce', 'Li', 'Ei', 'La', 'Ea', 'Su', 'Eu', 'Lb', 'Lo']
-        con_sequence = [signal if self.control_signals.get(signal, 0) else f"~{signal}" for signal in signals]
+        con_sequence = [signal if self.control_signals.get(signal, 0) else f"~{signal}" for signal in CONTROL_SIGNALS]
         print(f"CON = {' '.join(con_sequence)}")
 
     def print_state(self, step_description):
         """Display the current state of the simulation"""
-        opcode = self.IR >> 4
-        address = self.IR & 0x0F
+        if not self.verbose:
+            return
+        opcode = self.IR >> self.address_bits
+        address = self.IR & self.address_mask
         instruction_name = self.instructions.get(opcode, 'UNK')
+        digits = self.address_digits
         
         print(f"\n{step_description}")
         print(f"T-state: T{self.t_state}")
-        print(f"PC: {self.PC:02X}, MAR: {self.MAR:02X}, IR: {self.IR:02X} ({instruction_name} {address:01X}), "
+        print(f"PC: {self.PC:0{digits}X}, MAR: {self.MAR:0{digits}X}, "
+              f"IR: {self.IR:0{self.ir_digits}X} ({instruction_name} {address:01X}), "
               f"ACC: {self.ACC:02X}, TMP: {self.TMP:02X}, OUT: {self.OUT:02X}")
 
         active_signals = [signal for signal, value in self.control_signals.items() if value]
@@ -135,9 +286,9 @@ class SAP1Simulator:
 
         # Display bus content
         if self.control_signals['Ep']:
-            print(f"Bus: PC -> {self.PC:02X}")
+            print(f"Bus: PC -> {self.PC:0{digits}X}")
         elif self.control_signals['Ei']:
-            print(f"Bus: IR -> {self.IR:02X}")
+            print(f"Bus: IR -> {self.IR:0{self.ir_digits}X}")
         elif self.control_signals['Ea'] and not self.control_signals['Eu']:
             print(f"Bus: ACC -> {self.ACC:02X}")
         elif self.control_signals['Eu']:
@@ -163,8 +314,13 @@ class SAP1Simulator:
         self.reset_control_signals()
         self.control_signals['Ce'] = 1
         self.control_signals['Li'] = 1
-        self.IR = self.memory[self.MAR]
-        self.PC = (self.PC + 1) & 0x0F  # Wrap around at 16
+        if self.instruction_bytes == 1:
+            self.IR = self.memory[self.MAR]
+        else:
+            self.IR = self.read_word(self.MAR)
+        if self.fetch_counts is not None:
+            self.count_fetch(self.MAR)
+        self.PC = (self.PC + self.instruction_bytes) & self.address_mask  # Wrap around at end of memory
         self.print_state("FETCH T2: IR <- Memory[MAR], PC <- PC+1")
 
         # T3: Decode Instruction
@@ -174,8 +330,8 @@ class SAP1Simulator:
 
     def execute_cycle(self):
         """Execute the appropriate instruction (T4-T6)"""
-        opcode = self.IR >> 4
-        address = self.IR & 0x0F
+        opcode = self.IR >> self.address_bits
+        address = self.IR & self.address_mask
         
         if opcode == 0x1:  # LDA
             return self.execute_lda(address)
@@ -205,7 +361,11 @@ class SAP1Simulator:
         self.reset_control_signals()
         self.control_signals['La'] = 1
         self.ACC = self.memory[self.MAR]
+        if self.read_counts is not None:
+            self.read_counts[self.MAR] += 1
         self.print_state("EXECUTE LDA T5: ACC <- Memory[MAR]")
+        if self.early_reset:
+            return False
 
         # T6: No operation
         self.t_state = 6
@@ -229,6 +389,8 @@ class SAP1Simulator:
         self.reset_control_signals()
         self.control_signals['Lb'] = 1
         self.TMP = self.memory[self.MAR]
+        if self.read_counts is not None:
+            self.read_counts[self.MAR] += 1
         self.print_state("EXECUTE ADD T5: TMP <- Memory[MAR]")
 
         # T6: ACC <- ACC + TMP
@@ -257,6 +419,8 @@ class SAP1Simulator:
         self.reset_control_signals()
         self.control_signals['Lb'] = 1
         self.TMP = self.memory[self.MAR]
+        if self.read_counts is not None:
+            self.read_counts[self.MAR] += 1
         self.print_state("EXECUTE SUB T5: TMP <- Memory[MAR]")
 
         # T6: ACC <- ACC - TMP
@@ -280,6 +444,8 @@ class SAP1Simulator:
         self.control_signals['Lo'] = 1
         self.OUT = self.ACC
         self.print_state("EXECUTE OUT T4: OUT <- ACC")
+        if self.early_reset:
+            return False
 
         # T5: No operation
         self.t_state = 5
@@ -300,33 +466,526 @@ class SAP1Simulator:
         self.print_state("EXECUTE HLT T4: HALT")
         return True
 
-    def run(self):
-        """Run the complete simulation"""
-        print("\nSAP-1 SIMULATION")
-        print("=" * 60)
+    def set_mode(self, mode):
+        """Switch between 'cycle' (T-state accurate) and 'instruction' (net effect only).
+
+        Both modes leave identical registers and memory at every instruction
+        boundary, so switching between step_instruction() calls is always safe.
+        """
+        if mode not in ('cycle', 'instruction'):
+            raise ValueError(f"unknown execution mode: {mode}")
+        self.mode = mode
+
+    def step_instruction(self):
+        """Run one full instruction (fetch + execute); returns True on HLT"""
+        if self.mode == 'instruction':
+            return self.fast_step()
+        self.fetch_cycle()
+        return self.execute_cycle()
+
+    def fast_step(self):
+        """Apply one instruction's net effect without T-state or control-signal bookkeeping"""
+        memory = self.memory
+        pc = self.PC
+        if self.instruction_bytes == 1:
+            ir = memory[pc]
+        else:
+            ir = self.read_word(pc)
+        self.IR = ir
+        self.PC = (pc + self.instruction_bytes) & self.address_mask
+        opcode = ir >> self.address_bits
+        fetches = self.fetch_counts
+        if fetches is not None:
+            if self.instruction_bytes == 1:
+                fetches[pc] += 1
+            else:
+                self.count_fetch(pc)
 
-        print("\nInitial Memory Contents:")
-        for i in range(0, 16, 4):
-            mem_values = [f"{self.memory[j]:02X}" for j in range(i, min(i+4, 16))]
-            print(f"Address {i:02X}-{min(i+3, 15):02X}: {' '.join(mem_values)}")
+        if opcode == 0x1:  # LDA
+            address = ir & self.address_mask
+            self.MAR = address
+            self.ACC = memory[address]
+        elif opcode == 0x2:  # ADD
+            address = ir & self.address_mask
+            self.MAR = address
+            self.TMP = memory[address]
+            self.ACC = (self.ACC + self.TMP) & 0xFF
+        elif opcode == 0x3:  # SUB
+            address = ir & self.address_mask
+            self.MAR = address
+            self.TMP = memory[address]
+            self.ACC = (self.ACC - self.TMP) & 0xFF
+        else:
+            self.MAR = pc
+            if opcode == 0xE:  # OUT
+                self.OUT = self.ACC
+            elif opcode == 0xF:  # HLT
+                return True
+
+        if fetches is not None and 0x1 <= opcode <= 0x3:
+            self.read_counts[address] += 1
+        return False
 
-        print("\nStarting Execution:")
-        print("=" * 60)
+    def state_key(self):
+        """Machine state at an instruction boundary, for loop detection.
+
+        The ISA never writes memory, so registers and the T-state fix the
+        rest of the run; leaving memory out keeps the 'hash' table's entries
+        small however large memory is.
+        """
+        return (self.PC, self.MAR, self.IR, self.ACC, self.TMP, self.OUT, self.t_state)
+
+    def snapshot(self):
+        """Whole machine state as a compact blob for restore() (25 bytes with 16 bytes of memory)"""
+        return state_struct(self.memory_size).pack(
+            bytes(self.memory), self.PC, self.MAR, self.IR, self.ACC, self.TMP, self.OUT,
+            self.t_state, self.control_word())
+
+    def restore(self, blob):
+        """Load a snapshot() blob taken from a machine with the same memory size"""
+        layout = state_struct(self.memory_size)
+        if len(blob) != layout.size:
+            raise ValueError(f"snapshot is {len(blob)} bytes, expected {layout.size} for "
+                             f"{self.memory_size} bytes of memory")
+        memory, self.PC, self.MAR, self.IR, self.ACC, self.TMP, self.OUT, self.t_state, word = layout.unpack(blob)
+        self.memory[:] = memory
+        signals = self.control_signals
+        for bit, signal in enumerate(reversed(CONTROL_SIGNALS)):
+            signals[signal] = (word >> bit) & 1
+        # The ALU result is only latched while Eu drives it onto the bus, by then into ACC
+        self.last_alu_result = self.ACC if signals['Eu'] else None
+
+    def quiet_copy(self):
+        """Independent silent copy of this machine without hooks, used to look ahead or replay"""
+        clone = copy.copy(self)
+        clone.memory = bytearray(self.memory)
+        clone.control_signals = dict(self.control_signals)
+        clone.hooks = {event: [] for event in HOOK_EVENTS}
+        clone.verbose = False
+        clone.fetch_counts = clone.read_counts = None  # Look-ahead accesses are not the machine's
+        if self.hook_base is not None:
+            clone.__class__ = self.hook_base
+        return clone
+
+    def add_hook(self, event, callback):
+        """Call callback(simulator) on a hook event (see HOOK_EVENTS).
+
+        T-state hooks fire in cycle mode only. Until the first hook is added
+        the machine runs the plain class, so unused hooks cost nothing.
+        """
+        if event not in HOOK_EVENTS:
+            raise ValueError(f"unknown hook event: {event}")
+        self.hooks[event].append(callback)
+        if self.hook_base is None:
+            self.__class__ = hooked_class(type(self))
+
+    def remove_hook(self, event, callback):
+        """Unregister a hook; the last one removed switches back to the plain class"""
+        self.hooks[event].remove(callback)
+        if self.hook_base is not None and not any(self.hooks.values()):
+            self.__class__ = self.hook_base
+
+    def find_loop_entry(self, initial, period):
+        """Replay from the initial machine to find where a loop of the given period starts"""
+        tortoise = initial.quiet_copy()
+        hare = initial.quiet_copy()
+        for _ in range(period):
+            hare.step_instruction()
+        entry = 0
+        while tortoise.state_key() != hare.state_key():
+            tortoise.step_instruction()
+            hare.step_instruction()
+            entry += 1
+        return entry, tortoise.PC
+
+    def jit_allowed(self, loop_detection=None):
+        """T-state tracing or loop detection deoptimise back to the interpreter"""
+        tracing = self.verbose and self.mode == 'cycle'
+        counting = self.early_reset  # Cycle accounting needs every instruction
+        return self.jit and not tracing and not counting and loop_detection is None and self.hook_base is None
+
+    def compile_trace(self):
+        """Generate a function running whole PC cycles of the current memory image.
+
+        Returns (function, trace length, final IR, final MAR, final TMP, operand
+        reads per cycle as (address, count) pairs), or None when the cycle
+        contains HLT or is too long to be worth compiling.
+        The ISA never writes memory, so the trace is fixed by the image and
+        every operand can be folded in as a constant.
+        """
+        step = self.instruction_bytes
+        length = self.memory_size // step
+        if self.memory_size % step or length > self.jit_max_trace:
+            return None
+
+        body = []
+        acc = None   # ACC value when known at compile time
+        delta = 0    # Pending ADD/SUB total while ACC is only known at run time
+        ir = mar = tmp = None
+        reads = {}
+        for pc in range(0, self.memory_size, step):
+            ir = self.read_word(pc)
+            opcode = ir >> self.address_bits
+            address = ir & self.address_mask
+            if opcode == 0xF:
+                return None
+            if opcode in (0x1, 0x2, 0x3):
+                mar = address
+                value = self.memory[address]
+                reads[address] = reads.get(address, 0) + 1
+                if opcode == 0x1:
+                    acc, delta = value, 0
+                else:
+                    tmp = value
+                    change = value if opcode == 0x2 else -value
+                    if acc is None:
+                        delta += change
+                    else:
+                        acc = (acc + change) & 0xFF
+            else:
+                mar = pc
+                if opcode == 0xE:
+                    if acc is not None:
+                        body.append(f"out = {acc}")
+                    else:
+                        if delta % 256:
+                            body.append(f"acc = (acc + {delta % 256}) & 0xFF")
+                            delta = 0
+                        body.append("out = acc")
+
+        # Only the last OUT of a cycle is observable
+        last_out = max((i for i, line in enumerate(body) if line.startswith("out =")), default=None)
+        body = [line for i, line in enumerate(body) if i == last_out or not line.startswith("out =")]
+        if acc is not None:
+            body.append(f"acc = {acc}")
+        elif delta % 256:
+            body.append(f"acc = (acc + {delta % 256}) & 0xFF")
+
+        source = "def trace(acc, out, iterations):\n    for _ in range(iterations):\n"
+        source += "".join(f"        {line}\n" for line in body or ["pass"])
+        source += "    return acc, out\n"
+        namespace = {}
+        exec(source, namespace)
+        namespace['trace'].source = source
+        return namespace['trace'], length, ir, mar, tmp, tuple(reads.items())
+
+    def run_trace(self, budget=None):
+        """Run whole PC cycles through the compiled trace; returns instructions executed"""
+        if self.memory_size // self.instruction_bytes > self.jit_max_trace:
+            return 0  # Never compilable, so not worth a cache entry keyed on the whole image
+        key = bytes(self.memory)
+        cache = self.jit_cache
+        if key in cache:
+            cache.move_to_end(key)
+        else:
+            cache[key] = self.compile_trace()
+            if len(cache) > JIT_CACHE_SIZE:
+                cache.popitem(last=False)
+        compiled = cache[key]
+        if compiled is None:
+            return 0
+
+        trace, length, ir, mar, tmp, reads = compiled
+        iterations = self.jit_batch if budget is None else budget // length
+        if iterations <= 0:
+            return 0
+        self.ACC, self.OUT = trace(self.ACC, self.OUT, iterations)
+        self.IR = ir
+        self.MAR = mar
+        if tmp is not None:
+            self.TMP = tmp
+        if self.last_alu_result is not None:
+            self.last_alu_result = self.ACC
+        if self.fetch_counts is not None:
+            # Each cycle fetches every cell once and makes the same operand reads
+            fetches = self.fetch_counts
+            for cell in range(self.memory_size):
+                fetches[cell] += iterations
+            for address, count in reads:
+                self.read_counts[address] += count * iterations
+        return iterations * length
+
+    def run(self, max_instructions=20, loop_detection=None):
+        """Run the complete simulation
+
+        max_instructions caps the run (None for no cap). loop_detection ends
+        a non-halting run as soon as the machine state repeats:
+          'hash'  - remember every state; finds the loop on its first repeat
+          'brent' - O(1) extra memory, at most ~2 loop periods late
+          'floyd' - one look-ahead copy of the machine, at most 1 period late
+        """
+        if loop_detection not in (None, 'hash', 'brent', 'floyd'):
+            raise ValueError(f"unknown loop detection method: {loop_detection}")
+
+        if self.verbose:
+            print("\nSAP-1 SIMULATION")
+            print("=" * 60)
+
+            print("\nInitial Memory Contents:")
+            row = 4 if self.memory_size == 16 else 16
+            digits = self.address_digits
+            for i in range(0, self.memory_size, row):
+                chunk = self.memory[i:i + row]
+                if self.memory_size > 256 and not any(chunk):
+                    continue  # Keep large images readable
+                mem_values = [f"{value:02X}" for value in chunk]
+                print(f"Address {i:0{digits}X}-{i + row - 1:0{digits}X}: {' '.join(mem_values)}")
+
+            print("\nStarting Execution:")
+            print("=" * 60)
 
         halt = False
         instruction_count = 0
-
-        while not halt and instruction_count < 20:
-            self.fetch_cycle()
-            halt = self.execute_cycle()
+        self.loop_info = None
+        period = None
+        use_jit = self.jit_allowed(loop_detection)
+        wraps = 0
+        cycles = 0 if self.early_reset else None
+        classic = 0  # What the same instructions take without early reset, counted alongside
+
+        if loop_detection == 'hash':
+            seen = {self.state_key(): 0}
+        elif loop_detection == 'brent':
+            initial = self.quiet_copy()
+            tortoise, power, lam = self.state_key(), 1, 0
+        elif loop_detection == 'floyd':
+            initial = self.quiet_copy()
+            hare = self.quiet_copy()
+
+        while not halt and (max_instructions is None or instruction_count < max_instructions):
+            if use_jit and self.PC == 0 and instruction_count:
+                wraps += 1
+                if wraps >= self.jit_threshold:
+                    budget = None if max_instructions is None else max_instructions - instruction_count
+                    executed = self.run_trace(budget)
+                    if executed == 0:
+                        use_jit = False  # Not compilable, or too little budget left for a cycle
+                    instruction_count += executed
+                    continue
+
+            halt = self.step_instruction()
             instruction_count += 1
+            if cycles is not None:
+                opcode = self.IR >> self.address_bits
+                cycles += EARLY_RESET_TSTATES.get(opcode, 3)
+                classic += TSTATES.get(opcode, 3)
+            if halt or loop_detection is None:
+                continue
+
+            if loop_detection == 'hash':
+                key = self.state_key()
+                first = seen.get(key)
+                if first is not None:
+                    self.loop_info = {'method': 'hash', 'period': instruction_count - first,
+                                      'entry': first, 'entry_pc': self.PC,
+                                      'detected_at': instruction_count}
+                    break
+                seen[key] = instruction_count
+
+            elif loop_detection == 'brent':
+                key = self.state_key()
+                lam += 1
+                if key == tortoise:
+                    period = lam
+                    break
+                if power == lam:
+                    tortoise, power, lam = key, power * 2, 0
+
+            elif hare is not None:
+                # Floyd: the hare runs two instructions for every one of ours
+                if hare.step_instruction() or hare.step_instruction():
+                    hare = None  # The program halts, so there is no loop to find
+                elif hare.state_key() == self.state_key():
+                    period = 1
+                    hare.step_instruction()
+                    while hare.state_key() != self.state_key():
+                        hare.step_instruction()
+                        period += 1
+                    break
+
+        if period is not None:
+            entry, entry_pc = self.find_loop_entry(initial, period)
+            self.loop_info = {'method': loop_detection, 'period': period, 'entry': entry,
+                              'entry_pc': entry_pc, 'detected_at': instruction_count}
+
+        self.clock_cycles = cycles
+        if halt:
+            self.stop_reason = 'halt'
+        elif self.loop_info:
+            self.stop_reason = 'loop'
+        else:
+            self.stop_reason = 'limit'
+
+        if self.verbose:
+            print("\nFINAL RESULTS:")
+            print("=" * 60)
+            print(f"Output register: {self.OUT:02X} (Decimal: {self.OUT})")
+            print(f"Program completed: {'Yes' if halt else 'No'}")
+            if cycles is not None:
+                print(f"Clock cycles: {cycles} with early reset, {classic} without "
+                      f"({classic - cycles} saved, {(classic - cycles) / (classic or 1):.1%})")
+            if self.loop_info:
+                print(f"Loop detected ({self.loop_info['method']}): period {self.loop_info['period']} "
+                      f"instructions, entered after instruction {self.loop_info['entry']} "
+                      f"at PC {self.loop_info['entry_pc']:0{self.address_digits}X}")
+
+        return halt
+
+
+def access_table(fetches, reads, digits=2, hottest=None):
+    """Table lines of per-cell fetch and read counts: accessed cells by address, or the hottest first"""
+    rows = [(address, fetch, read) for address, (fetch, read) in enumerate(zip(fetches, reads)) if fetch or read]
+    if hottest is not None:
+        rows = sorted(rows, key=lambda row: row[1] + row[2], reverse=True)[:hottest]
+    width = max(4, digits)
+    lines = [f"{'Addr':>{width}} {'Fetches':>10} {'Reads':>10} {'Total':>10}"]
+    for address, fetch, read in rows:
+        label = f"{address:0{digits}X}"
+        lines.append(f"{label:>{width}} {fetch:>10} {read:>10} {fetch + read:>10}")
+    return lines
+
+
+_state_structs = {}
+
+
+def state_struct(memory_size):
+    """Snapshot layout: memory, PC, MAR, IR, ACC, TMP, OUT, T-state, control word"""
+    if memory_size not in _state_structs:
+        address = 'B' if memory_size <= 0x100 else 'H'
+        instruction = 'B' if memory_size <= 0x10 else 'H' if memory_size <= 0x1000 else 'I'
+        _state_structs[memory_size] = struct.Struct(f'<{memory_size}s{address}{address}{instruction}BBBBH')
+    return _state_structs[memory_size]
+
+
+_hooked_classes = {}
+
+
+def hooked_class(cls):
+    """Subclass of cls whose T-state and instruction steps call the registered hooks"""
+    if cls not in _hooked_classes:
+        class Hooked(cls):
+            __slots__ = ()  # Same layout as cls, so instances can switch class
+            hook_base = cls
+
+            def reset_control_signals(self):
+                # Every T-state starts by clearing the control lines
+                for callback in self.hooks['before_tstate']:
+                    callback(self)
+                cls.reset_control_signals(self)
+
+            def print_state(self, step_description):
+                # ...and ends by reporting its state
+                cls.print_state(self, step_description)
+                for callback in self.hooks['after_tstate']:
+                    callback(self)
+
+            def step_instruction(self):
+                for callback in self.hooks['before_instruction']:
+                    callback(self)
+                halt = cls.step_instruction(self)
+                for callback in self.hooks['after_instruction']:
+                    callback(self)
+                return halt
+
+        Hooked.__name__ = Hooked.__qualname__ = f"Hooked{cls.__name__}"
+        _hooked_classes[cls] = Hooked
+    return _hooked_classes[cls]
+
+
+class SimulatorPool:
+    """Reusable quiet simulators for batch runners, reset in place between programs"""
+
+    # Per-instance options a caller may change; release() puts back the pool's values
+    SETTINGS = ('verbose', 'mode', 'jit', 'jit_threshold', 'jit_max_trace', 'jit_batch', 'early_reset')
+
+    def __init__(self, max_size=64, **options):
+        self.options = {'interactive': False, 'verbose': False, **options}
+        self.max_size = max_size
+        # The first simulator doubles as the record of the pool's settings
+        template = SAP1Simulator(**self.options)
+        self.settings = {name: getattr(template, name) for name in self.SETTINGS}
+        self.counting = template.fetch_counts is not None
+        self.free = [template]
+
+    def acquire(self, image=None):
+        """A power-on simulator with image loaded (zeroed memory without one), reused when one is free"""
+        if self.free:
+            simulator = self.free.pop()
+            simulator.reset(b"" if image is None else image)
+            return simulator
+        simulator = SAP1Simulator(**self.options)
+        if image is not None:
+            simulator.load_image(image)
+        return simulator
+
+    def release(self, simulator):
+        """Hand a simulator back; it must not be used again by the caller"""
+        if len(self.free) < self.max_size and simulator.hook_base is None:
+            for name, value in self.settings.items():
+                setattr(simulator, name, value)
+            if not self.counting:
+                simulator.fetch_counts = simulator.read_counts = None
+            elif simulator.fetch_counts is None:
+                simulator.fetch_counts = array('Q', bytes(8 * simulator.memory_size))
+                simulator.read_counts = array('Q', bytes(8 * simulator.memory_size))
+            self.free.append(simulator)
 
-        print("\nFINAL RESULTS:")
-        print("=" * 60)
-        print(f"Output register: {self.OUT:02X} (Decimal: {self.OUT})")
-        print(f"Program completed: {'Yes' if halt else 'No'}")
 
 # Run the simulation
 if __name__ == "__main__":
-    simulator = SAP1Simulator()
-    simulator.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SAP-1 simulator")
+    parser.add_argument("--memory-size", type=int, default=16,
+                        help="memory size in bytes, a power of two from 16 to 65536 (default: 16)")
+    parser.add_argument("--max-instructions", type=int, default=20,
+                        help="stop after this many instructions, 0 for no limit (default: 20)")
+    parser.add_argument("--detect-loops", choices=("hash", "brent", "floyd"),
+                        help="end non-halting programs as soon as the machine state repeats")
+    parser.add_argument("--fast", action="store_true",
+                        help="instruction-accurate mode: skip the T-state trace and report only results")
+    parser.add_argument("--jit", action="store_true",
+                        help="compile wrap-around loops into traces (ignored while printing the T-state trace)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-opcode and host-time histograms after the run")
+    parser.add_argument("--early-reset", action="store_true",
+                        help="end each instruction after its last useful T-state and report the cycles saved")
+    parser.add_argument("--vcd", metavar="PATH",
+                        help="write the run's T-states as a VCD waveform (not with --fast)")
+    parser.add_argument("--access-counts", action="store_true",
+                        help="print per-cell instruction fetch and operand read counts after the run")
+    parser.add_argument("--clock-hz", type=float, metavar="HZ",
+                        help="pace T-states to a real-time clock, 0.5 Hz to 100 kHz (not with --fast)")
+    args = parser.parse_args()
+    if not 16 <= args.memory_size <= 0x10000 or args.memory_size & (args.memory_size - 1):
+        parser.error("--memory-size must be a power of two from 16 to 65536")
+    if args.vcd and args.fast:
+        parser.error("--vcd needs T-states; drop --fast")
+    if args.clock_hz is not None:
+        from sap1_clock import MAX_HZ, MIN_HZ, pace
+        if not MIN_HZ <= args.clock_hz <= MAX_HZ:
+            parser.error(f"--clock-hz must be from {MIN_HZ:g} to {MAX_HZ:g}")
+        if args.fast:
+            parser.error("--clock-hz paces T-states; drop --fast")
+
+    simulator = SAP1Simulator(memory_size=args.memory_size, mode='instruction' if args.fast else 'cycle',
+                              jit=args.jit, early_reset=args.early_reset, count_accesses=args.access_counts)
+    profiler = None
+    if args.profile:
+        from sap1_profile import Profiler
+        profiler = Profiler(simulator)
+    vcd = None
+    if args.vcd:
+        from sap1_vcd import VCDWriter
+        vcd = VCDWriter(args.vcd, simulator, attach=True)
+    clock = None
+    if args.clock_hz is not None:
+        clock = pace(simulator, args.clock_hz)
+    simulator.run(max_instructions=args.max_instructions or None, loop_detection=args.detect_loops)
+    if vcd:
+        vcd.close()
+    if clock:
+        print(clock.report())
+    if args.access_counts:
+        print("\nMemory accesses:")
+        print("\n".join(access_table(simulator.fetch_counts, simulator.read_counts, simulator.address_digits)))
+    if profiler:
+        profiler.report()
\ No newline at end of file
@@ -1,5 +1,5 @@
 class SAP1Simulator:
-    def __init__(self):
+    def __init__(self, interactive=True):
         # Initialize all registers to zero (all zeroes)
         self.PC = 0    # Program Counter
         self.MAR = 0   # Memory Address Register
@@ -30,8 +30,9 @@ class SAP1Simulator:
             0xF: 'HLT'
         }
         
-        # Initialize memory with user program
-        self.initialize_memory_with_user_input()
+        # Initialize memory with user program (only prompt if interactive requested)
+        if interactive:
+            self.initialize_memory_with_user_input()
     
     def get_user_input(self):
         """Get program instructions and data from user"""
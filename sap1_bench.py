@@ -0,0 +1,220 @@
+"""Throughput benchmark across the SAP-1 simulator variants.
+
+Every variant runs the same fixed workloads in each output mode it supports
+and reports T-states/s, instructions/s and peak memory per run.
+
+    python sap1_bench.py run -o baseline.json
+    python sap1_bench.py run -o current.json
+    python sap1_bench.py compare baseline.json current.json --threshold 10
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from sap1_variants import README_IMAGE, VARIANTS, discard_output, make_simulator
+
+# Reproducible workloads, all 16-byte images
+WORKLOADS = {
+    # 10 + 5 - 2 from the README
+    'readme': README_IMAGE,
+    # Every defined opcode, NOP included, then HLT
+    'all-opcodes': bytes([0x1D, 0x2E, 0x3F, 0xE0, 0x00, 0x2E, 0xE0, 0x3F,
+                          0xE0, 0x1E, 0x2D, 0xE0, 0xF0, 0x07, 0x03, 0x02]),
+    # No HLT: the Final engine wraps the PC, the others run off the end of memory
+    'wrap-around': bytes([0x2F, 0xE0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                          0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x2F, 0x01]),
+    # Only six-T-state instructions and no HLT, so every variant runs to its cap
+    'worst-case': bytes([0x2F, 0x3F, 0xE0, 0x2F, 0x3F, 0xE0, 0x2F, 0x3F,
+                         0xE0, 0x2F, 0x3F, 0xE0, 0x2F, 0x3F, 0xE0, 0x05]),
+}
+
+# Instruction cap for the workloads with no HLT, where the variant's run()
+# takes one (only the Final engine's does). Well above the JIT's threshold of
+# two PC wraps, so the jit rows spend most of each run in the compiled trace.
+RUN_CAPS = {'wrap-around': 1024, 'worst-case': 1024}
+
+# Output mode -> make_simulator() options, per variant
+MODES = {
+    'verbose': {},
+    'quiet': {'quiet': True},
+}
+FINAL_MODES = {
+    'fast': {'quiet': True, 'mode': 'instruction'},
+    'jit': {'quiet': True, 'mode': 'instruction', 'jit': True},
+}
+
+
+def modes_for(variant):
+    if variant == 'final':
+        return {**MODES, **FINAL_MODES}
+    return MODES
+
+
+def run_capped(variant, sim, cap):
+    """Run sim, to cap instructions where the variant takes a cap"""
+    if cap is not None and variant == 'final':
+        sim.run(max_instructions=cap)
+    else:
+        sim.run()
+
+
+def count_work(variant, image, cap):
+    """Instructions and T-states one run executes, counted on an instrumented run"""
+    sim = make_simulator(variant, image, quiet=True)
+    counts = {'instructions': 0, 'tstates': 0}
+    # The other variants take the Final engine's 16-byte timings
+    timer = sim if hasattr(sim, 'tstate_table') else make_simulator('final', image, quiet=True)
+    tstates = timer.tstate_table()
+
+    def count(_=None):
+        counts['instructions'] += 1
+        counts['tstates'] += tstates[sim.IR >> 4]
+
+    if hasattr(sim, 'add_hook'):
+        sim.add_hook('after_instruction', count)
+    else:
+        execute_cycle = sim.execute_cycle
+
+        def counting_execute_cycle():
+            halt = execute_cycle()
+            count()
+            return halt
+
+        sim.execute_cycle = counting_execute_cycle
+    with discard_output():
+        run_capped(variant, sim, cap)
+    return counts
+
+
+def jit_traced(image, cap):
+    """Whether a jit-mode Final run of image compiled a trace for its loop"""
+    sim = make_simulator('final', image, **FINAL_MODES['jit'])
+    with discard_output():
+        run_capped('final', sim, cap)
+    return any(compiled is not None for compiled in sim.jit_cache.values())
+
+
+def time_runs(variant, image, cap, options, min_time):
+    """Repeat fresh runs until min_time seconds of run() time have accumulated"""
+    runs = 0
+    elapsed = 0.0
+    with discard_output():
+        while elapsed < min_time:
+            sim = make_simulator(variant, image, **options)
+            start = time.perf_counter()
+            run_capped(variant, sim, cap)
+            elapsed += time.perf_counter() - start
+            runs += 1
+    return runs, elapsed
+
+
+def peak_memory(variant, image, cap, options):
+    """Peak bytes allocated while building and running one simulator"""
+    with discard_output():
+        tracemalloc.start()
+        sim = make_simulator(variant, image, **options)
+        run_capped(variant, sim, cap)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak
+
+
+def run_benchmarks(variants, workloads, min_time):
+    results = {}
+    for variant in variants:
+        for workload in workloads:
+            image = WORKLOADS[workload]
+            cap = RUN_CAPS.get(workload)
+            work = count_work(variant, image, cap)
+            if variant == 'final' and cap is not None and not jit_traced(image, cap):
+                raise RuntimeError(f"the JIT never ran a compiled trace on the {workload} workload")
+            for mode, options in modes_for(variant).items():
+                runs, elapsed = time_runs(variant, image, cap, options, min_time)
+                per_second = runs / elapsed
+                key = f"{variant}/{mode}/{workload}"
+                results[key] = {
+                    'runs': runs,
+                    'instructions': work['instructions'],
+                    'tstates': work['tstates'],
+                    'instructions_per_s': work['instructions'] * per_second,
+                    'tstates_per_s': work['tstates'] * per_second,
+                    'peak_bytes': peak_memory(variant, image, cap, options),
+                }
+                print(f"{key:<36} {results[key]['tstates_per_s']:>14,.0f} T/s "
+                      f"{results[key]['instructions_per_s']:>12,.0f} instr/s "
+                      f"{results[key]['peak_bytes'] / 1024:>8.1f} KiB", file=sys.stderr)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Return (key, metric, old, new, change %) for every regression above threshold %"""
+    regressions = []
+    for key, old in baseline['results'].items():
+        new = current['results'].get(key)
+        if new is None:
+            continue
+        # Throughput regresses when it drops, memory when it grows
+        for metric, sign in (('tstates_per_s', -1), ('instructions_per_s', -1), ('peak_bytes', 1)):
+            if not old[metric]:
+                continue
+            change = (new[metric] - old[metric]) / old[metric] * 100
+            if change * sign > threshold:
+                regressions.append((key, metric, old[metric], new[metric], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAP-1 simulator throughput benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON result file")
+    run_parser.add_argument("-o", "--output", help="JSON file to write (default: stdout)")
+    run_parser.add_argument("--variant", action="append", choices=sorted(VARIANTS),
+                            help="variant to benchmark (repeatable; default: all)")
+    run_parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS),
+                            help="workload to run (repeatable; default: all)")
+    run_parser.add_argument("--min-time", type=float, default=0.2,
+                            help="seconds of run() time to accumulate per measurement (default: 0.2)")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="percent change that counts as a regression (default: 10)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmarks(args.variant or list(VARIANTS), args.workload or list(WORKLOADS),
+                                 args.min_time)
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'min_time': args.min_time,
+            'results': results,
+        }
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, "w") as handle:
+                handle.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    regressions = compare(baseline, current, args.threshold)
+    for key, metric, old, new, change in regressions:
+        print(f"REGRESSION {key} {metric}: {old:,.0f} -> {new:,.0f} ({change:+.1f}%)")
+    if not regressions:
+        print(f"No regressions above {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
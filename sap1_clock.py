@@ -0,0 +1,127 @@
+"""Real-time clock pacing for the SAP-1 simulators.
+
+A Clock turns a target frequency (0.5 Hz to 100 kHz) into a tick schedule
+on the monotonic time.perf_counter(). Tick n is due at start + n / hz,
+never at "last tick + period", so late wake-ups and sleep granularity do
+not add up to drift. A caller that falls behind gets every missed tick
+back from due() at once (up to max_batch) and runs them as a batch. A
+backlog older than max_lag seconds is dropped and counted in skipped,
+rather than replayed as a burst.
+
+    python SAP-1-Sim-Final.py --clock-hz 2          # a breadboard clock, with the trace
+    python sap1_clock.py --hz 20000 --seconds 2     # how closely a quiet run holds 20 kHz
+"""
+import argparse
+import sys
+import time
+
+from sap1_variants import README_IMAGE, load_variant, parse_image
+
+Final = load_variant('final')
+
+MIN_HZ = 0.5
+MAX_HZ = 100_000
+
+
+class Clock:
+    """Tick schedule for a target frequency, with batched catch-up"""
+
+    def __init__(self, hz, max_batch=4096, max_lag=0.25, timer=time.perf_counter):
+        self.timer = timer  # Seconds source; a replay substitutes its recorded timeline
+        self.max_batch = max_batch
+        self.max_lag = max_lag
+        self.set_frequency(hz)
+
+    def set_frequency(self, hz):
+        """Change the target frequency; the schedule and statistics restart from now"""
+        if not MIN_HZ <= hz <= MAX_HZ:
+            raise ValueError(f"clock frequency must be from {MIN_HZ} to {MAX_HZ} Hz")
+        self.hz = hz
+        self.restart()
+
+    def restart(self):
+        """Start the schedule over from now, e.g. after a pause, so no backlog is owed"""
+        self.start = self.timer()
+        self.scheduled = 0  # Ticks handed out or skipped since start
+        self.ticks = 0      # Ticks handed out
+        self.skipped = 0
+        self.credit = 0     # Ticks claimed by tick() but not yet used
+
+    def due(self):
+        """Claim and return the number of ticks due now (0 when ahead of schedule)"""
+        owed = int((self.timer() - self.start) * self.hz) - self.scheduled
+        if owed <= 0:
+            return 0
+        lag_limit = max(1, int(self.max_lag * self.hz))
+        if owed > lag_limit:
+            self.skipped += owed - lag_limit
+            self.scheduled += owed - lag_limit
+            owed = lag_limit
+        owed = min(owed, self.max_batch)
+        self.scheduled += owed
+        self.ticks += owed
+        return owed
+
+    def until_next(self):
+        """Seconds until the next tick is due (0 when one already is)"""
+        return max(0.0, self.start + (self.scheduled + 1) / self.hz - self.timer())
+
+    def tick(self):
+        """Use one tick, sleeping until it is due; ticks already owed run back to back"""
+        if not self.credit:
+            while True:
+                self.credit = self.due()
+                if self.credit:
+                    break
+                time.sleep(self.until_next())
+        self.credit -= 1
+
+    def achieved(self):
+        """Ticks per second actually handed out since the schedule (re)started"""
+        elapsed = self.timer() - self.start
+        return (self.ticks - self.credit) / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        line = f"Clock: target {self.hz:g} Hz, achieved {self.achieved():.4g} Hz"
+        if self.skipped:
+            line += f" ({self.skipped} ticks skipped while behind)"
+        return line
+
+
+def pace(simulator, hz):
+    """Hold a Final engine's T-states to hz through its after_tstate hook; returns the Clock"""
+    clock = Clock(hz)
+
+    def on_tstate(sim):
+        if not clock.ticks:
+            clock.restart()  # The schedule starts at the first T-state, not while a program is typed in
+        clock.tick()
+
+    simulator.add_hook('after_tstate', on_tstate)
+    return clock
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a SAP-1 program quietly at a paced clock")
+    parser.add_argument("image", nargs="?", help="memory image in hex (default: the README program)")
+    parser.add_argument("--hz", type=float, default=1000.0, help="target T-state frequency (default: 1000)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="how long to run (default: 2)")
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size) if args.image else README_IMAGE
+    sim = Final.SAP1Simulator(interactive=False, memory_size=args.memory_size, verbose=False)
+    try:
+        clock = pace(sim, args.hz)
+    except ValueError as error:
+        parser.error(str(error))
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        sim.reset(image)  # Programs that halt start again until time is up
+        sim.run(max_instructions=max(1, int(args.hz / 20)))
+    print(clock.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
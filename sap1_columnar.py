@@ -0,0 +1,164 @@
+"""Columnar T-state traces of SAP-1 runs for analysis with NumPy, pandas and friends.
+
+A ColumnRecorder keeps one typed buffer per field (run, pc, mar, ir, acc,
+tmp, out, t_state, control_word) instead of printed lines. The buffers are
+array.array, which grows geometrically, so appending a T-state is a
+handful of C-level appends. Many runs can share one recorder; the run
+column tells them apart.
+
+Traces save as a directory of .npy files (one per column), an .npz
+archive or CSV. The .npy files are written directly in NumPy's format, so
+recording needs no NumPy, and np.load(path, mmap_mode='r') maps them
+without copying:
+
+    python sap1_columnar.py --random 1000 -o traces
+    python sap1_columnar.py 192a3be0f0000000000a050200000000 -o readme.csv
+
+    >>> acc = np.load('traces/acc.npy', mmap_mode='r')
+"""
+import argparse
+import ast
+import csv
+import os
+import sys
+import zipfile
+from array import array
+
+from sap1_fuzz import random_image
+from sap1_variants import README_IMAGE, load_variant, parse_image
+
+Final = load_variant('final')
+
+# Column -> NumPy little-endian dtype
+COLUMNS = {
+    'run': '<u4',
+    'pc': '<u2',
+    'mar': '<u2',
+    'ir': '<u4',
+    'acc': '|u1',
+    'tmp': '|u1',
+    'out': '|u1',
+    't_state': '|u1',
+    'control_word': '<u2',
+}
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def typecode(dtype):
+    """array.array typecode with the dtype's item size"""
+    size = int(dtype[-1])
+    return next(code for code in 'BHIL' if array(code).itemsize == size)
+
+
+class ColumnRecorder:
+    """One growable buffer per column, filled from a simulator's T-state hook"""
+
+    def __init__(self):
+        self.columns = {name: array(typecode(dtype)) for name, dtype in COLUMNS.items()}
+        self.runs = 0
+
+    def __len__(self):
+        return len(self.columns['run'])
+
+    def attach(self, simulator):
+        """Record every T-state simulator runs, as the next run number; returns the hook"""
+        run = self.runs
+        self.runs += 1
+        columns = self.columns
+        appends = [columns[name].append for name in COLUMNS]
+        run_append, pc, mar, ir, acc, tmp, out, t_state, control = appends
+
+        def on_tstate(sim):
+            run_append(run)
+            pc(sim.PC)
+            mar(sim.MAR)
+            ir(sim.IR)
+            acc(sim.ACC)
+            tmp(sim.TMP)
+            out(sim.OUT)
+            t_state(sim.t_state)
+            control(sim.control_word())
+
+        simulator.add_hook('after_tstate', on_tstate)
+        return on_tstate
+
+    def record(self, image, max_instructions=20, memory_size=16):
+        """Run one program quietly in cycle mode and append its trace"""
+        sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False)
+        sim.load_image(image)
+        self.attach(sim)
+        sim.run(max_instructions)
+
+    def save(self, path):
+        """Write by extension: .npz archive, .csv, or otherwise a directory of .npy files"""
+        if path.endswith('.npz'):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name in COLUMNS:
+                    with archive.open(f"{name}.npy", 'w', force_zip64=True) as handle:
+                        self.write_npy(handle, name)
+        elif path.endswith('.csv'):
+            with open(path, 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(COLUMNS)
+                writer.writerows(zip(*self.columns.values()))
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name in COLUMNS:
+                with open(os.path.join(path, f"{name}.npy"), 'wb') as handle:
+                    self.write_npy(handle, name)
+
+    def write_npy(self, handle, name):
+        """One column in .npy format version 1.0"""
+        column = self.columns[name]
+        header = repr({'descr': COLUMNS[name], 'fortran_order': False, 'shape': (len(column),)})
+        # Magic, 2-byte length, then the header padded so the data starts 64-byte aligned
+        padding = -(len(NPY_MAGIC) + 2 + len(header) + 1) % 64
+        header = (header + " " * padding + "\n").encode('latin1')
+        handle.write(NPY_MAGIC + len(header).to_bytes(2, 'little') + header)
+        if sys.byteorder == 'big' and column.itemsize > 1:
+            column = array(column.typecode, column)
+            column.byteswap()
+        handle.write(column.tobytes())
+
+
+def read_npy(path):
+    """Read a .npy column written by save() into an array.array, for use without NumPy"""
+    with open(path, 'rb') as handle:
+        if handle.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        length = int.from_bytes(handle.read(2), 'little')
+        header = ast.literal_eval(handle.read(length).decode('latin1'))
+        column = array(typecode(header['descr']))
+        column.frombytes(handle.read())
+    if sys.byteorder == 'big' and column.itemsize > 1:
+        column.byteswap()
+    return column
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record SAP-1 T-state traces as columns")
+    parser.add_argument("images", nargs="*", help="memory images in hex (default: the README program)")
+    parser.add_argument("--random", type=int, default=0, help="also record this many random programs")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --random (default: 0)")
+    parser.add_argument("-o", "--output", default="traces",
+                        help="a directory of .npy files, or a .npz or .csv file (default: traces)")
+    parser.add_argument("--max-instructions", type=int, default=20)
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    images = [parse_image(text, args.memory_size) for text in args.images]
+    images += [random_image(args.seed, index) for index in range(args.random)]
+    if not images:
+        images = [README_IMAGE]
+
+    recorder = ColumnRecorder()
+    for image in images:
+        recorder.record(image, args.max_instructions, args.memory_size)
+    recorder.save(args.output)
+    print(f"{recorder.runs} runs, {len(recorder)} T-states written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Coverage-guided program generator for the SAP-1 ISA.
+
+Random bytes mostly decode to NOP or undefined opcodes, so this generator
+keeps a corpus of programs and mutates it towards behaviour nobody has
+exercised yet. Coverage is every microcode entry the Final engine passes
+through (the shared fetch states once, execute states per opcode and control
+word), plus ALU and sequencing edge cases such as carry on ADD, borrow on
+SUB and PC wrap-around.
+
+The corpus is saved as JSON so the next run starts warm:
+
+    python sap1_coverage.py --corpus corpus.json --iterations 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+from sap1_variants import README_IMAGE, load_variant
+
+Final = load_variant('final')
+
+DEFINED_OPCODES = (0x0, 0x1, 0x2, 0x3, 0xE, 0xF)
+INTERESTING_DATA = (0x00, 0x01, 0x02, 0x7F, 0x80, 0xFE, 0xFF)
+
+# Edge cases beyond the microcode itself
+EDGE_CASES = (
+    'add-carry', 'add-no-carry', 'add-zero', 'add-signed-overflow',
+    'sub-borrow', 'sub-no-borrow', 'sub-zero', 'sub-signed-overflow',
+    'pc-wrap', 'undefined-opcode', 'hlt-at-last-address', 'instruction-cap',
+)
+
+
+class CoverageTracer(Final.SAP1Simulator):
+    """Final engine that records coverage points instead of printing each T-state"""
+
+    def __init__(self, image):
+        super().__init__(interactive=False, verbose=False)
+        self.load_image(image)
+        self.points = set()
+
+    def print_state(self, step_description):
+        opcode = self.IR >> 4
+        # Fetch (T1-T3) is the same for every instruction, and IR still holds
+        # the previous one during it, so only execute states count per opcode
+        key = opcode if self.t_state > 3 else None
+        self.points.add(('micro', key, self.t_state, self.control_word()))
+
+        signals = self.control_signals
+        if self.t_state == 2 and self.PC == 0:
+            self.points.add(('edge', 'pc-wrap'))
+        elif self.t_state == 3 and opcode not in self.instructions:
+            self.points.add(('edge', 'undefined-opcode'))
+        elif self.t_state == 4 and opcode == 0xF and self.MAR == self.address_mask:
+            self.points.add(('edge', 'hlt-at-last-address'))
+        elif self.t_state == 6 and signals['Eu']:
+            if signals['Su']:
+                before = (self.ACC + self.TMP) & 0xFF
+                self.points.add(('edge', 'sub-borrow' if before < self.TMP else 'sub-no-borrow'))
+                if self.ACC == 0:
+                    self.points.add(('edge', 'sub-zero'))
+                # Signed overflow: operand signs differ and the result takes the subtrahend's sign
+                if (before ^ self.TMP) & (before ^ self.ACC) & 0x80:
+                    self.points.add(('edge', 'sub-signed-overflow'))
+            else:
+                before = (self.ACC - self.TMP) & 0xFF
+                self.points.add(('edge', 'add-carry' if self.ACC < self.TMP else 'add-no-carry'))
+                if self.ACC == 0:
+                    self.points.add(('edge', 'add-zero'))
+                # Signed overflow: operands share a sign the result does not
+                if ~(before ^ self.TMP) & (before ^ self.ACC) & 0x80:
+                    self.points.add(('edge', 'add-signed-overflow'))
+
+
+def coverage_of(image):
+    tracer = CoverageTracer(image)
+    tracer.run()
+    if tracer.stop_reason == 'limit':
+        tracer.points.add(('edge', 'instruction-cap'))
+    return tracer.points
+
+
+def known_points():
+    """Every microcode entry the control unit can produce, plus the edge cases"""
+    points = {('edge', case) for case in EDGE_CASES}
+    for opcode in range(16):
+        # Each opcode once, followed by HLT so its execute states complete
+        points |= {point for point in coverage_of(bytes([opcode << 4 | 0x2, 0xF0]))
+                   if point[0] == 'micro'}
+    return points
+
+
+def random_instruction(rng):
+    return rng.choice(DEFINED_OPCODES) << 4 | rng.randrange(16)
+
+
+def mutate(image, rng):
+    """Apply one to four structure-aware mutations"""
+    image = bytearray(image)
+    for _ in range(rng.randint(1, 4)):
+        i = rng.randrange(len(image))
+        choice = rng.randrange(6)
+        if choice == 0:
+            image[i] = random_instruction(rng)
+        elif choice == 1:
+            image[i] = rng.choice(INTERESTING_DATA)
+        elif choice == 2:
+            image[i] ^= 1 << rng.randrange(8)
+        elif choice == 3:
+            image[i] = (image[i] & 0xF0) | rng.randrange(16)  # New operand, same opcode
+        elif choice == 4:
+            j = rng.randrange(len(image))
+            image[i], image[j] = image[j], image[i]
+        else:
+            image[i] = 0xF0
+    return bytes(image)
+
+
+def load_corpus(path):
+    if not path or not os.path.exists(path):
+        return [README_IMAGE]
+    with open(path) as handle:
+        return [bytes.fromhex(entry) for entry in json.load(handle)['corpus']]
+
+
+def save_corpus(path, corpus, covered):
+    with open(path, "w") as handle:
+        json.dump({
+            'corpus': [image.hex() for image in corpus],
+            'coverage': sorted(" ".join(str(part) for part in point) for point in covered),
+        }, handle, indent=1)
+
+
+def describe(point):
+    if point[0] == 'edge':
+        return point[1]
+    _, opcode, t_state, word = point
+    if opcode is None:
+        return f"fetch T{t_state} CON {word:012b}"
+    return f"opcode {opcode:X} T{t_state} CON {word:012b}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coverage-guided SAP-1 program generator")
+    parser.add_argument("--corpus", help="JSON corpus to load and save (created if missing)")
+    parser.add_argument("--iterations", type=int, default=20000, help="mutations to try (default: 20000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus(args.corpus)
+    covered = set()
+    for image in corpus:
+        covered |= coverage_of(image)
+    warm = len(covered)
+
+    for _ in range(args.iterations):
+        candidate = mutate(rng.choice(corpus), rng)
+        new = coverage_of(candidate) - covered
+        if new:
+            covered |= new
+            corpus.append(candidate)
+
+    known = known_points()
+    print(f"Corpus: {len(corpus)} programs")
+    print(f"Coverage: {len(covered & known)}/{len(known)} points "
+          f"({warm} from the saved corpus, {len(covered) - warm} new this run)")
+    missing = sorted(known - covered, key=describe)
+    if missing:
+        print("Unexplored:")
+        for point in missing:
+            print(f"  {describe(point)}")
+
+    if args.corpus:
+        save_corpus(args.corpus, corpus, covered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""Conditional breakpoints and watchpoints for the SAP-1 engines, and a command-line debugger.
+
+Breakpoints are Python expressions over the machine state:
+
+    ACC > 0x80 and t_state == 6
+    PC == 3 or opcode == 0xE
+    mem[0xA] != 5 and Lb
+
+Names are PC, MAR, IR, ACC, TMP, OUT, t_state, opcode and address (the
+fields of IR), mem[address] and the control lines Cp ... Lo. A watchpoint
+is any such expression and hits whenever its value changes.
+
+Everything set is compiled into one generated function returning the first
+hit, so a check is a single call. Checks run after every instruction, or
+after every T-state once an expression uses t_state or a control line.
+With nothing set the debugger steps with no checks at all.
+
+    python sap1_debug.py 192a3be0f0000000000a050200000000 --break "ACC > 0x10"
+    python sap1_debug.py --break "t_state == 5 and La" --watch OUT --run
+"""
+import argparse
+import ast
+import sys
+
+from sap1_variants import README_IMAGE, load_variant, parse_image
+
+Final = load_variant('final')
+
+REGISTERS = ('PC', 'MAR', 'IR', 'ACC', 'TMP', 'OUT')
+
+# Expression syntax a breakpoint may use: no calls, attributes or assignments
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.IfExp, ast.Subscript,
+    ast.Name, ast.Constant, ast.Load, ast.And, ast.Or, ast.Not, ast.Invert, ast.UAdd, ast.USub,
+    ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.LShift, ast.RShift, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+)
+
+
+class BreakpointHit(Exception):
+    """Raised from the T-state hook to stop inside an instruction"""
+
+    def __init__(self, index):
+        super().__init__(index)
+        self.index = index
+
+
+class Breakpoints:
+    """Breakpoint conditions and watchpoints compiled into a single check(sim) function.
+
+    check() returns the index into labels of the first hit, or None. Works
+    with any simulator exposing the registers, memory, t_state and
+    control_signals (the Final engine, sap4.py).
+    """
+
+    def __init__(self, conditions=(), watches=(), simulator=None):
+        self.conditions = list(conditions)
+        self.watches = list(watches)
+        self.labels = [f"break {text}" for text in self.conditions] + [f"watch {text}" for text in self.watches]
+        bits = getattr(simulator, 'address_bits', 4)
+        memory_size = len(simulator.memory) if simulator is not None else 16
+        self.names = {name: f"sim.{name}" for name in REGISTERS + ('t_state',)}
+        self.names.update({signal: f"sim.control_signals[{signal!r}]" for signal in Final.CONTROL_SIGNALS})
+        self.names.update({'opcode': f"(sim.IR >> {bits})", 'address': f"(sim.IR & {(1 << bits) - 1})",
+                           'mem': 'sim.memory'})
+        self.memory_mask = memory_size - 1
+
+        # T-state granularity is only needed when something can change inside an instruction
+        self.tstate = False
+        conditions = [self.translate(text) for text in self.conditions]
+        watches = [self.translate(text) for text in self.watches]
+
+        lines = ["def check(sim):"]
+        if watches:
+            # Every watch is refreshed on each check so none reports a stale change later
+            lines.append("    hit = None")
+            for number, expression in enumerate(watches):
+                index = len(conditions) + number
+                lines += [f"    value = {expression}",
+                          f"    if value != watched[{number}]:",
+                          f"        watched[{number}] = value",
+                          f"        if hit is None: hit = {index}"]
+            lines.append("    if hit is not None: return hit")
+        for index, expression in enumerate(conditions):
+            lines.append(f"    if {expression}: return {index}")
+        lines.append("    return None")
+        lines.append(f"def values(sim):\n    return [{', '.join(watches)}]")
+
+        self.watched = [None] * len(watches)
+        namespace = {'watched': self.watched}
+        exec(compile("\n".join(lines), "<breakpoints>", "exec"), namespace)
+        self.check = namespace['check']
+        self.values = namespace['values']
+        if simulator is not None:
+            self.arm(simulator)
+
+    def translate(self, text):
+        """Validate one expression and rewrite it into Python source reading sim"""
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as error:
+            raise ValueError(f"bad expression {text!r}: {error.msg}") from None
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError(f"bad expression {text!r}: {type(node).__name__} is not allowed")
+            if isinstance(node, ast.Name) and node.id not in self.names:
+                raise ValueError(f"bad expression {text!r}: unknown name {node.id!r}")
+            if isinstance(node, ast.Subscript) and not (isinstance(node.value, ast.Name) and node.value.id == 'mem'):
+                raise ValueError(f"bad expression {text!r}: only mem[...] can be indexed")
+        names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+        if 'mem' in names and not any(isinstance(node, ast.Subscript) for node in ast.walk(tree)):
+            raise ValueError(f"bad expression {text!r}: use mem[address]")
+        if 't_state' in names or names & set(Final.CONTROL_SIGNALS):
+            self.tstate = True
+
+        breakpoints = self
+
+        class Rewrite(ast.NodeTransformer):
+            def visit_Subscript(self, node):
+                index = ast.BinOp(self.visit(node.slice), ast.BitAnd(), ast.Constant(breakpoints.memory_mask))
+                return ast.Subscript(self.visit(node.value), index, ast.Load())
+
+            def visit_Name(self, node):
+                return ast.parse(breakpoints.names[node.id], mode='eval').body
+
+        return f"({ast.unparse(Rewrite().visit(tree).body)})"
+
+    def arm(self, simulator):
+        """Take the watched values from simulator as the baseline for changes"""
+        self.watched[:] = self.values(simulator)
+
+
+class Debugger:
+    """Runs a Final engine until a breakpoint or watchpoint hits, HLT or an instruction limit"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.conditions = []
+        self.watches = []
+        self.breakpoints = None
+        self.hit = None
+        self.instructions = 0
+        self.halted = False
+        # (snapshot at the instruction's start, T-state stopped at) while paused inside an instruction
+        self.paused = None
+        self.skip_tstates = 0
+
+    def add_breakpoint(self, text):
+        self.rebuild(self.conditions + [text], self.watches)
+
+    def add_watchpoint(self, text):
+        self.rebuild(self.conditions, self.watches + [text])
+
+    def delete(self, number):
+        """Remove breakpoint or watchpoint number (1-based, as listed by labels())"""
+        if not 1 <= number <= len(self.conditions) + len(self.watches):
+            raise ValueError(f"no breakpoint {number}")
+        conditions, watches = list(self.conditions), list(self.watches)
+        if number <= len(conditions):
+            del conditions[number - 1]
+        else:
+            del watches[number - 1 - len(conditions)]
+        self.rebuild(conditions, watches)
+
+    def rebuild(self, conditions, watches):
+        # Compile before storing, so a bad expression leaves the old set in place
+        breakpoints = Breakpoints(conditions, watches, self.simulator) if conditions or watches else None
+        self.conditions, self.watches, self.breakpoints = conditions, watches, breakpoints
+
+    def labels(self):
+        return self.breakpoints.labels if self.breakpoints else []
+
+    def run(self, max_instructions=None):
+        """Continue; returns 'break', 'halt' or 'limit' (the hit's label index is in self.hit)"""
+        sim = self.simulator
+        self.hit = None
+        if self.halted:
+            return 'halt'
+        budget = max_instructions
+        breakpoints = self.breakpoints
+        if self.paused is not None or (breakpoints is not None and breakpoints.tstate):
+            return self.run_tstates(budget)
+
+        step = sim.step_instruction
+        executed = 0
+        if breakpoints is None:
+            # Nothing to check: the bare stepping loop
+            while budget is None or executed < budget:
+                executed += 1
+                if step():
+                    self.instructions += executed
+                    self.halted = True
+                    return 'halt'
+            self.instructions += executed
+            return 'limit'
+
+        check = breakpoints.check
+        while budget is None or executed < budget:
+            executed += 1
+            self.instructions += 1
+            if step():
+                self.halted = True
+                return 'halt'
+            hit = check(sim)
+            if hit is not None:
+                self.hit = hit
+                return 'break'
+        return 'limit'
+
+    def run_tstates(self, budget):
+        """Cycle-mode run checking after every T-state; a hit pauses inside the instruction.
+
+        The engine cannot stop mid-instruction, so the hook raises out of it
+        and continuing replays that instruction from a snapshot of its start,
+        ignoring the T-states already seen.
+        """
+        sim = self.simulator
+        check = self.breakpoints.check if self.breakpoints else None
+
+        def after_tstate(sim):
+            if sim.t_state > self.skip_tstates and check is not None:
+                hit = check(sim)
+                if hit is not None:
+                    raise BreakpointHit(hit)
+
+        mode = sim.mode
+        sim.set_mode('cycle')
+        sim.add_hook('after_tstate', after_tstate)
+        try:
+            executed = 0
+            while budget is None or executed < budget:
+                if self.paused is not None:
+                    start, self.skip_tstates = self.paused
+                    self.paused = None
+                    sim.restore(start)
+                else:
+                    start = sim.snapshot()
+                try:
+                    halt = sim.step_instruction()
+                except BreakpointHit as hit:
+                    self.paused = (start, sim.t_state)
+                    self.hit = hit.index
+                    return 'break'
+                finally:
+                    self.skip_tstates = 0
+                executed += 1
+                self.instructions += 1
+                if halt:
+                    self.halted = True
+                    return 'halt'
+            return 'limit'
+        finally:
+            sim.remove_hook('after_tstate', after_tstate)
+            sim.set_mode(mode)
+
+    def step(self):
+        """Run one instruction (or finish the one paused in) without checking breakpoints"""
+        breakpoints, self.breakpoints = self.breakpoints, None
+        try:
+            return self.run(1)
+        finally:
+            self.breakpoints = breakpoints
+            if breakpoints:
+                breakpoints.arm(self.simulator)
+
+    def step_tstate(self):
+        """Advance one T-state, pausing inside the instruction"""
+        breakpoints, self.breakpoints = self.breakpoints, Breakpoints(['True'], simulator=self.simulator)
+        self.breakpoints.tstate = True
+        try:
+            # Two instructions: finishing one paused at its last T-state stops in the next
+            return self.run(2)
+        finally:
+            self.breakpoints = breakpoints
+            if breakpoints:
+                breakpoints.arm(self.simulator)
+
+
+def describe(sim):
+    """One-line machine state"""
+    opcode = sim.IR >> sim.address_bits
+    signals = " ".join(signal for signal, value in sim.control_signals.items() if value) or "-"
+    return (f"PC={sim.PC:0{sim.address_digits}X} MAR={sim.MAR:0{sim.address_digits}X} "
+            f"IR={sim.IR:0{sim.ir_digits}X} ({sim.instructions.get(opcode, 'UNK')}) "
+            f"ACC={sim.ACC:02X} TMP={sim.TMP:02X} OUT={sim.OUT:02X} T{sim.t_state} [{signals}]")
+
+
+def report(debugger, reason, stepping=False):
+    """Print why the machine stopped (steps only mention HLT) and its state"""
+    if reason == 'halt':
+        print(f"Halted after {debugger.instructions} instructions")
+    elif reason == 'break' and not stepping:
+        print(f"Hit #{debugger.hit + 1} {debugger.labels()[debugger.hit]} "
+              f"after {debugger.instructions} instructions")
+    elif reason == 'limit' and not stepping:
+        print("Instruction limit reached")
+    print(describe(debugger.simulator))
+
+
+HELP = """Commands:
+  c [N]         continue (at most N instructions)
+  s             step one instruction
+  t             step one T-state
+  b EXPR        add a breakpoint
+  w EXPR        add a watchpoint
+  d N           delete breakpoint or watchpoint N
+  i             list breakpoints and watchpoints
+  p             print the machine state
+  q             quit"""
+
+
+def interact(debugger, max_instructions):
+    """Read debugger commands from stdin until q or end of input"""
+    print(describe(debugger.simulator))
+    while True:
+        try:
+            line = input("(sap1) ").strip()
+        except EOFError:
+            return
+        command, _, argument = line.partition(" ")
+        try:
+            if command in ("q", "quit"):
+                return
+            elif command in ("c", "continue"):
+                report(debugger, debugger.run(int(argument, 0) if argument else max_instructions))
+            elif command in ("s", "step"):
+                report(debugger, debugger.step(), stepping=True)
+            elif command in ("t", "tstep"):
+                report(debugger, debugger.step_tstate(), stepping=True)
+            elif command in ("b", "break"):
+                debugger.add_breakpoint(argument)
+            elif command in ("w", "watch"):
+                debugger.add_watchpoint(argument)
+            elif command in ("d", "delete"):
+                debugger.delete(int(argument))
+            elif command in ("i", "info"):
+                for number, label in enumerate(debugger.labels(), 1):
+                    print(f"  {number}: {label}")
+            elif command in ("p", "print"):
+                print(describe(debugger.simulator))
+            elif command:
+                print(HELP)
+        except ValueError as error:
+            print(f"Error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Debug a SAP-1 program with conditional breakpoints")
+    parser.add_argument("image", nargs="?", help="memory image in hex (default: the README program)")
+    parser.add_argument("--break", dest="breaks", action="append", default=[], metavar="EXPR",
+                        help="stop when EXPR is true (repeatable)")
+    parser.add_argument("--watch", action="append", default=[], metavar="EXPR",
+                        help="stop when EXPR changes value (repeatable)")
+    parser.add_argument("--run", action="store_true",
+                        help="no prompt: continue to every hit until HLT or the limit")
+    parser.add_argument("--max-instructions", type=int, default=1000,
+                        help="instructions per continue, 0 for no limit (default: 1000)")
+    parser.add_argument("--memory-size", type=int, default=16)
+    parser.add_argument("--fast", action="store_true",
+                        help="step in instruction mode while no T-state breakpoint is set")
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size) if args.image else README_IMAGE
+    sim = Final.SAP1Simulator(interactive=False, memory_size=args.memory_size, verbose=False,
+                              mode='instruction' if args.fast else 'cycle')
+    sim.load_image(image)
+    debugger = Debugger(sim)
+    try:
+        for text in args.breaks:
+            debugger.add_breakpoint(text)
+        for text in args.watch:
+            debugger.add_watchpoint(text)
+    except ValueError as error:
+        parser.error(str(error))
+
+    limit = args.max_instructions or None
+    if not args.run:
+        interact(debugger, limit)
+        return 0
+
+    reason = 'break'
+    while reason == 'break':
+        reason = debugger.run(limit)
+        report(debugger, reason)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Run one SAP-1 program against many data sets from a shared execution prefix.
+
+Data sets overlay bytes on a base image. A single machine runs while no
+data set's values could change the outcome. Before an instruction fetches
+from or reads an address where the data sets differ, the machine forks.
+Each fork carries the data sets that agree on the bytes read and continues
+on its own. SAP-1 has no store instruction, so memory never changes after
+loading: a fork only records the registers, and the one machine resumes a
+branch by loading them together with the (shared, read-only) image of any
+of its data sets.
+
+    python sap1_explore.py 192a3be0f0000000000a050200000000 --data 9=10,10=5 --data 9=10,10=7
+    python sap1_explore.py 192a3be0f0000000000a050200000000 --random 500 --vary 10,11 --verify
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from sap1_variants import load_variant, parse_image
+
+Final = load_variant('final')
+
+# Opcodes whose operand is a memory read
+MEMORY_OPCODES = (0x1, 0x2, 0x3)
+
+
+class Branch:
+    """Registers at a fork and the data sets (by index) that have all taken its path so far"""
+
+    def __init__(self, registers, members, images, executed, candidates):
+        self.registers = registers
+        self.members = members
+        self.executed = executed
+        first = images[members[0]]
+        # Addresses (among the parent's) where the members disagree; reading one forces a fork
+        self.varying = {address for address in candidates
+                        if any(images[member][address] != first[address] for member in members[1:])}
+
+
+def registers(sim):
+    return sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT
+
+
+def overlay(image, data, memory_size):
+    """Base image with a data set's {address: value} bytes written over it"""
+    memory = bytearray(image) + bytes(memory_size - len(image))
+    for address, value in data.items():
+        memory[address & (memory_size - 1)] = value & 0xFF
+    return bytes(memory)
+
+
+def pending_reads(sim, varying):
+    """Varying addresses the next instruction reads, checking the fetch before the operand"""
+    fetch = [(sim.PC + offset) & sim.address_mask for offset in range(sim.instruction_bytes)]
+    reads = [address for address in fetch if address in varying]
+    if reads:
+        return reads
+    ir = sim.read_word(sim.PC)
+    address = ir & sim.address_mask
+    if ir >> sim.address_bits in MEMORY_OPCODES and address in varying:
+        return [address]
+    return []
+
+
+def fork(sim, branch, reads, images):
+    """Split a branch by the values its members hold at the addresses about to be read"""
+    groups = {}
+    for member in branch.members:
+        groups.setdefault(bytes(images[member][address] for address in reads), []).append(member)
+    state = registers(sim)
+    return [Branch(state, members, images, branch.executed, branch.varying) for members in groups.values()]
+
+
+def explore(image, datasets, max_instructions=20, memory_size=16):
+    """Run every data set; returns (per-data-set results, work statistics)"""
+    images = [overlay(image, data, memory_size) for data in datasets]
+    sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False, mode='instruction')
+
+    overridden = {address & (memory_size - 1) for data in datasets for address in data}
+    stack = [Branch(registers(sim), list(range(len(images))), images, 0, overridden)]
+    results = [None] * len(images)
+    stats = {'data_sets': len(images), 'forks': 0, 'branches': 1,
+             'instructions': 0, 'independent_instructions': 0}
+
+    while stack:
+        branch = stack.pop()
+        sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT = branch.registers
+        sim.memory[:] = images[branch.members[0]]
+        step = sim.step_instruction
+        varying = branch.varying
+        executed = start = branch.executed
+        halted = False
+        while not halted and executed < max_instructions:
+            reads = varying and pending_reads(sim, varying)
+            if reads:
+                branch.executed = executed
+                children = fork(sim, branch, reads, images)
+                stats['forks'] += 1
+                stats['branches'] += len(children) - 1
+                stack.extend(children)
+                break
+            halted = step()
+            executed += 1
+        else:
+            result = {'halted': halted, 'pc': sim.PC, 'acc': sim.ACC, 'out': sim.OUT,
+                      'instructions': executed}
+            for member in branch.members:
+                results[member] = result
+        stats['instructions'] += executed - start
+        stats['independent_instructions'] += (executed - start) * len(branch.members)
+
+    independent = stats['independent_instructions']
+    stats['saved'] = 1 - stats['instructions'] / independent if independent else 0.0
+    return results, stats
+
+
+def run_independently(image, datasets, max_instructions=20, memory_size=16):
+    """Reference: one fresh run per data set"""
+    pool = Final.SimulatorPool(max_size=1, memory_size=memory_size, mode='instruction')
+    results = []
+    for data in datasets:
+        sim = pool.acquire(overlay(image, data, memory_size))
+        executed = 0
+        halted = False
+        while not halted and executed < max_instructions:
+            halted = sim.step_instruction()
+            executed += 1
+        results.append({'halted': halted, 'pc': sim.PC, 'acc': sim.ACC, 'out': sim.OUT,
+                        'instructions': executed})
+        pool.release(sim)
+    return results
+
+
+def parse_data(text):
+    """'9=10,10=0x05' -> {9: 10, 10: 5}"""
+    data = {}
+    for part in text.replace(',', ' ').split():
+        address, value = part.split('=')
+        data[int(address, 0)] = int(value, 0)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a SAP-1 program against many data sets with shared prefixes")
+    parser.add_argument("image", help="program image in hex")
+    parser.add_argument("--data", action="append", default=[], help="data set as address=value,... (repeatable)")
+    parser.add_argument("--data-file", help="file with one data set per line")
+    parser.add_argument("--random", type=int, default=0, help="add this many random data sets over --vary")
+    parser.add_argument("--vary", default="", help="addresses the random data sets fill (e.g. 10,11)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --random (default: 0)")
+    parser.add_argument("--max-instructions", type=int, default=20)
+    parser.add_argument("--memory-size", type=int, default=16)
+    parser.add_argument("--verify", action="store_true", help="also run every data set alone and compare")
+    parser.add_argument("--json", help="write per-data-set results and statistics to this file")
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size)
+    datasets = [parse_data(text) for text in args.data]
+    if args.data_file:
+        with open(args.data_file) as handle:
+            datasets += [parse_data(line) for line in handle if line.strip()]
+    rng = random.Random(args.seed)
+    addresses = [int(address, 0) for address in args.vary.replace(',', ' ').split()]
+    datasets += [{address: rng.randrange(256) for address in addresses} for _ in range(args.random)]
+    if not datasets:
+        parser.error("give data sets with --data, --data-file or --random")
+
+    start = time.perf_counter()
+    results, stats = explore(image, datasets, args.max_instructions, args.memory_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"{stats['data_sets']} data sets, {stats['forks']} forks into {stats['branches']} branches")
+    print(f"Instructions executed: {stats['instructions']} "
+          f"(independent runs: {stats['independent_instructions']}, {stats['saved']:.1%} saved)")
+    print(f"Explore time: {elapsed * 1e3:.2f} ms")
+
+    if args.verify:
+        start = time.perf_counter()
+        reference = run_independently(image, datasets, args.max_instructions, args.memory_size)
+        reference_time = time.perf_counter() - start
+        mismatches = [i for i, (a, b) in enumerate(zip(results, reference)) if a != b]
+        print(f"Independent time: {reference_time * 1e3:.2f} ms ({reference_time / elapsed:.1f}x)")
+        print(f"Verify: {len(datasets) - len(mismatches)}/{len(datasets)} data sets match")
+        if mismatches:
+            for i in mismatches[:10]:
+                print(f"  #{i} {datasets[i]}: explored {results[i]}, independent {reference[i]}")
+            return 1
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({'stats': stats, 'results': [dict(result, data={str(k): v for k, v in data.items()})
+                                                   for result, data in zip(results, datasets)]},
+                      handle, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Differential fuzzer for the SAP-1 simulator variants.
+
+Random 16-byte images (reproducible from --seed and the program index) run
+through every variant in quiet mode across a process pool. Programs whose
+final state differs are bucketed by the first field that diverges and by
+which variants agree, and one example per bucket is minimised.
+
+    python sap1_fuzz.py --seed 1 --programs 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sap1_variants import VARIANTS, discard_output, make_simulator
+
+# Final-state fields compared across variants, in the order divergences are reported
+FIELDS = ('halt', 'pc', 'acc-range', 'acc', 'out')
+
+
+def random_image(seed, index):
+    """The index-th program of a seed's stream"""
+    return random.Random((seed << 32) | index).randbytes(16)
+
+
+def outcome(variant, image):
+    """Final (halted, PC, ACC, OUT) of one quiet run"""
+    sim = make_simulator(variant, image, quiet=True)
+    sim.run()
+    halted = sim.IR >> 4 == 0xF and sim.t_state == 4
+    return halted, sim.PC, sim.ACC, sim.OUT
+
+
+def field_value(field, result):
+    halted, pc, acc, out = result
+    if field == 'halt':
+        return halted
+    if field == 'pc':
+        return pc
+    if field == 'acc-range':
+        return 0 <= acc <= 0xFF
+    if field == 'acc':
+        return acc
+    return out
+
+
+def classify(outcomes):
+    """Bucket name for the first diverging field, or None when all variants agree"""
+    for field in FIELDS:
+        groups = {}
+        for variant, result in outcomes.items():
+            groups.setdefault(field_value(field, result), []).append(variant)
+        if len(groups) > 1:
+            partition = " | ".join(sorted(",".join(names) for names in groups.values()))
+            return f"{field}: {partition}"
+    return None
+
+
+def run_image(variants, image):
+    return {variant: outcome(variant, image) for variant in variants}
+
+
+def fuzz_chunk(variants, seed, start, count):
+    """Worker: run programs start..start+count and return (index, bucket) for divergences"""
+    divergences = []
+    with discard_output():
+        for index in range(start, start + count):
+            bucket = classify(run_image(variants, random_image(seed, index)))
+            if bucket:
+                divergences.append((index, bucket))
+    return divergences
+
+
+def minimise(variants, image, bucket):
+    """Shrink an image while it still lands in the same bucket.
+
+    Bytes are cleared to 0 (a NOP, or zero data) first, then each remaining
+    nibble is tried at 0, until no single change keeps the divergence.
+    """
+    def same_bucket(candidate):
+        with discard_output():
+            return classify(run_image(variants, bytes(candidate))) == bucket
+
+    best = bytearray(image)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(best)):
+            for mask in (0x00, 0xF0, 0x0F):
+                if best[i] & ~mask & 0xFF == 0:
+                    continue
+                candidate = bytearray(best)
+                candidate[i] &= mask
+                if same_bucket(candidate):
+                    best = candidate
+                    changed = True
+                    break
+    return bytes(best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzer across the SAP-1 variants")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the program stream (default: 0)")
+    parser.add_argument("--programs", type=int, default=100000, help="programs to run (default: 100000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk", type=int, default=2000, help="programs per work unit (default: 2000)")
+    parser.add_argument("--variant", action="append", choices=sorted(VARIANTS),
+                        help="variant to include (repeatable; default: all)")
+    parser.add_argument("--json", help="also write the bucket report to this file")
+    args = parser.parse_args()
+
+    variants = args.variant or list(VARIANTS)
+    buckets = {}
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(fuzz_chunk, variants, args.seed, start, min(args.chunk, args.programs - start))
+                   for start in range(0, args.programs, args.chunk)]
+        for future in futures:
+            for index, bucket in future.result():
+                entry = buckets.setdefault(bucket, {'count': 0, 'first_index': index})
+                entry['count'] += 1
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{args.programs} programs x {len(variants)} variants in {elapsed:.1f}s "
+          f"({args.programs / elapsed * 60:,.0f} programs/min), {len(buckets)} divergence buckets")
+
+    for bucket, entry in sorted(buckets.items(), key=lambda item: -item[1]['count']):
+        image = random_image(args.seed, entry['first_index'])
+        reduced = minimise(variants, image, bucket)
+        with discard_output():
+            results = run_image(variants, reduced)
+        entry['image'] = image.hex()
+        entry['minimised'] = reduced.hex()
+        entry['outcomes'] = {variant: dict(zip(('halted', 'pc', 'acc', 'out'), result))
+                             for variant, result in results.items()}
+        print(f"\n[{entry['count']}x] {bucket}")
+        print(f"  first: #{entry['first_index']} {image.hex()}")
+        print(f"  minimised: {reduced.hex()}")
+        for variant, result in results.items():
+            halted, pc, acc, out = result
+            print(f"    {variant:<12} halted={halted!s:<5} PC={pc} ACC={acc} OUT={out}")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({'seed': args.seed, 'programs': args.programs, 'variants': variants,
+                       'seconds': elapsed, 'buckets': buckets}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Golden-trace regression store for the Final SAP-1 engine.
+
+Each golden file holds the full T-state trace of one program, compressed
+with zstd when the zstandard package is installed and with gzip (zlib)
+otherwise, and named after a hash of the program image plus its memory
+size and instruction cap, so one program can be stored at several
+settings. Recording refuses to replace a trace whose header disagrees
+unless --force is given. Checking replays
+every stored program and compares it T-state by T-state against the
+stored trace while decompressing, stopping at the first difference.
+
+    python sap1_golden.py record 192a3be0f0000000000a050200000000
+    python sap1_golden.py record --corpus corpus.json
+    python sap1_golden.py check
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sap1_variants import HERE, load_variant, parse_image
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+Final = load_variant('final')
+
+DEFAULT_STORE = os.path.join(HERE, 'golden_traces')
+
+# One record per T-state: t_state, PC, MAR, IR, ACC, TMP, OUT, control word
+RECORD = struct.Struct('<BHHIBBBH')
+
+
+class TraceMismatch(Exception):
+    """The replayed program left the stored trace"""
+
+
+class TraceRecorder(Final.SAP1Simulator):
+    """Final engine that hands every T-state to a callback instead of printing it"""
+
+    def __init__(self, image, memory_size, on_tstate):
+        super().__init__(interactive=False, memory_size=memory_size, verbose=False)
+        self.load_image(image)
+        self.on_tstate = on_tstate
+
+    def print_state(self, step_description):
+        self.on_tstate(RECORD.pack(self.t_state, self.PC, self.MAR, self.IR, self.ACC,
+                                   self.TMP, self.OUT, self.control_word()))
+
+
+def image_key(image):
+    return hashlib.sha256(image).hexdigest()[:16]
+
+
+def trace_name(image, max_instructions, memory_size):
+    """File name stem: the image hash plus the run settings, so each setting gets its own trace"""
+    return f"{image_key(image)}-{memory_size}b-{max_instructions}i"
+
+
+def read_header(path):
+    with open_trace(path, 'rb') as stored:
+        return json.loads(stored.readline())
+
+
+def open_trace(path, mode):
+    """Open a trace for streaming in 'rb' or 'wb' mode, picking the codec from the extension"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path} needs the zstandard package")
+        handle = open(path, mode)
+        if mode == 'wb':
+            return zstandard.ZstdCompressor(level=19).stream_writer(handle, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(handle, closefd=True))
+    # mtime=0 keeps re-recorded files byte-identical
+    return gzip.GzipFile(path, mode, compresslevel=9, mtime=0)
+
+
+def record(image, store, max_instructions=20, memory_size=16, force=False):
+    """Run a program and write its golden trace; returns the file path.
+
+    Raises FileExistsError rather than replace a stored trace whose header
+    disagrees, unless force is set.
+    """
+    os.makedirs(store, exist_ok=True)
+    extension = '.trace.zst' if zstandard else '.trace.gz'
+    path = os.path.join(store, trace_name(image, max_instructions, memory_size) + extension)
+    header = {'image': image.hex(), 'max_instructions': max_instructions, 'memory_size': memory_size}
+    if os.path.exists(path) and not force:
+        stored = read_header(path)
+        if stored != header:
+            raise FileExistsError(f"{path} was recorded with {stored}; use --force to replace it")
+    with open_trace(path, 'wb') as out:
+        out.write(json.dumps(header).encode() + b"\n")
+        TraceRecorder(image, memory_size, out.write).run(max_instructions)
+    return path
+
+
+def check(path):
+    """Replay one golden program; returns (path, error message or None)"""
+    with open_trace(path, 'rb') as stored:
+        header = json.loads(stored.readline())
+        index = 0
+
+        def compare(actual):
+            nonlocal index
+            expected = stored.read(RECORD.size)
+            if expected != actual:
+                if len(expected) < RECORD.size:
+                    raise TraceMismatch(f"T-state {index}: trace is longer than the golden copy")
+                raise TraceMismatch(f"T-state {index}: expected {describe(expected)}, got {describe(actual)}")
+            index += 1
+
+        try:
+            TraceRecorder(bytes.fromhex(header['image']), header['memory_size'],
+                          compare).run(header['max_instructions'])
+        except TraceMismatch as error:
+            return path, str(error)
+        if stored.read(RECORD.size):
+            return path, f"T-state {index}: trace ends before the golden copy"
+    return path, None
+
+
+def describe(packed):
+    t_state, pc, mar, ir, acc, tmp, out, word = RECORD.unpack(packed)
+    return (f"T{t_state} PC={pc:02X} MAR={mar:02X} IR={ir:02X} ACC={acc:02X} "
+            f"TMP={tmp:02X} OUT={out:02X} CON={word:012b}")
+
+
+def golden_files(store):
+    if not os.path.isdir(store):
+        return []
+    return sorted(os.path.join(store, name) for name in os.listdir(store)
+                  if name.endswith(('.trace.gz', '.trace.zst')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-trace regression store for the SAP-1 engine")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"trace directory (default: {DEFAULT_STORE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record golden traces")
+    record_parser.add_argument("images", nargs="*", help="memory images in hex")
+    record_parser.add_argument("--corpus", help="also record every program in a sap1_coverage.py corpus")
+    record_parser.add_argument("--max-instructions", type=int, default=20)
+    record_parser.add_argument("--memory-size", type=int, default=16)
+    record_parser.add_argument("--force", action="store_true",
+                               help="replace stored traces whose header disagrees")
+
+    check_parser = commands.add_parser("check", help="replay every golden program and compare")
+    check_parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        images = [parse_image(text, args.memory_size) for text in args.images]
+        if args.corpus:
+            with open(args.corpus) as handle:
+                images += [parse_image(text, args.memory_size) for text in json.load(handle)['corpus']]
+        for image in images:
+            try:
+                print(record(image, args.store, args.max_instructions, args.memory_size, args.force))
+            except FileExistsError as error:
+                print(f"error: {error}", file=sys.stderr)
+                return 1
+        return 0
+
+    paths = golden_files(args.store)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(check, paths, chunksize=16))
+    failures = [(path, error) for path, error in results if error]
+    for path, error in failures:
+        print(f"FAIL {os.path.basename(path)}: {error}")
+    print(f"{len(paths) - len(failures)}/{len(paths)} golden traces match")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
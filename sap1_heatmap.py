@@ -0,0 +1,101 @@
+"""Memory access heatmaps of SAP-1 programs, aggregated over batches of runs.
+
+Every program runs quietly on a Final engine with count_accesses set,
+which counts instruction fetches (T2) and operand reads (T5) per memory
+cell. The counts are summed over the batch. A grading corpus then shows
+which cells its programs actually lean on: hot data cells, never-fetched
+tails of memory, and so on.
+
+    python sap1_heatmap.py 192a3be0f0000000000a050200000000
+    python sap1_heatmap.py --corpus corpus.json --top 8
+    python sap1_heatmap.py --random 10000 --max-instructions 100
+"""
+import argparse
+import json
+import sys
+from array import array
+
+from sap1_fuzz import random_image
+from sap1_variants import README_IMAGE, load_variant, parse_image
+
+Final = load_variant('final')
+
+# Heatmap shades, from untouched to the hottest cell
+SHADES = " .:-=+*#%@"
+
+
+class AccessCounts:
+    """Per-cell fetch and read totals over many runs"""
+
+    def __init__(self, memory_size=16):
+        self.memory_size = memory_size
+        self.digits = max(2, ((memory_size - 1).bit_length() + 3) // 4)  # Hex digits per address
+        self.fetches = array('Q', bytes(8 * memory_size))
+        self.reads = array('Q', bytes(8 * memory_size))
+        self.runs = 0
+
+    def add(self, simulator):
+        """Add a counting simulator's counts for the run it just finished"""
+        fetches, reads = self.fetches, self.reads
+        for cell, (fetch, read) in enumerate(zip(simulator.fetch_counts, simulator.read_counts)):
+            fetches[cell] += fetch
+            reads[cell] += read
+        self.runs += 1
+
+    def run(self, images, max_instructions=20, jit=True):
+        """Run every image and add its counts"""
+        pool = Final.SimulatorPool(memory_size=self.memory_size, mode='instruction', jit=jit,
+                                   count_accesses=True)
+        for image in images:
+            sim = pool.acquire(image)
+            sim.run(max_instructions)
+            self.add(sim)
+            pool.release(sim)
+
+    def heatmap(self, row=16):
+        """Lines of one shade per cell, row cells per line; rows nobody touched are left out"""
+        totals = [fetch + read for fetch, read in zip(self.fetches, self.reads)]
+        hottest = max(totals) or 1
+        digits = self.digits
+        lines = [" " * (digits + 2) + "".join(f"{column:X}" for column in range(row))]
+        for start in range(0, self.memory_size, row):
+            chunk = totals[start:start + row]
+            if self.memory_size > 256 and not any(chunk):
+                continue
+            shades = "".join(SHADES[-(-total * (len(SHADES) - 1) // hottest)] for total in chunk)
+            lines.append(f"{start:0{digits}X}  {shades}")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate SAP-1 memory access counts over a batch of programs")
+    parser.add_argument("images", nargs="*", help="memory images in hex")
+    parser.add_argument("--corpus", help="also run every program in a sap1_coverage.py corpus")
+    parser.add_argument("--random", type=int, default=0, help="also run this many random programs")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --random (default: 0)")
+    parser.add_argument("--top", type=int, default=10, help="hottest cells to list, 0 for every accessed cell "
+                                                            "by address (default: 10)")
+    parser.add_argument("--max-instructions", type=int, default=20)
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    images = [parse_image(text, args.memory_size) for text in args.images]
+    if args.corpus:
+        with open(args.corpus) as handle:
+            images += [parse_image(text, args.memory_size) for text in json.load(handle)['corpus']]
+    images += [random_image(args.seed, index) for index in range(args.random)]
+    if not images:
+        images = [README_IMAGE]
+
+    counts = AccessCounts(args.memory_size)
+    counts.run(images, args.max_instructions)
+    print(f"{counts.runs} runs: {sum(counts.fetches)} instruction fetches, {sum(counts.reads)} operand reads")
+    print(f"\nHeatmap (fetches + reads, '{SHADES[1]}' coolest to '{SHADES[-1]}' hottest):")
+    print("\n".join(counts.heatmap()))
+    print("\nHottest cells:" if args.top else "\nAccessed cells:")
+    print("\n".join(Final.access_table(counts.fetches, counts.reads, counts.digits, args.top or None)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Metrics for long-running SAP-1 simulator workers.
+
+Counters (programs run, instructions and T-states executed, runs by stop
+reason, instructions per opcode), an in-flight gauge and a run latency
+histogram. Each thread updates its own shard without locking; exports sum
+the shards, so instrumented workers never wait on each other.
+
+Exports are Prometheus text over HTTP on localhost and a JSON file
+rewritten every few seconds:
+
+    python sap1_metrics.py --programs 100000 --workers 4 --port 9101 --json metrics.json
+    curl http://127.0.0.1:9101/metrics
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sap1_fuzz import random_image
+from sap1_variants import load_variant
+
+Final = load_variant('final')
+
+STOP_REASONS = ('halt', 'limit', 'loop')
+
+# Run latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                   0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, float('inf'))
+
+PERCENTILES = (50, 90, 99)
+
+
+class Shard:
+    """One thread's counters; only that thread writes to it"""
+
+    def __init__(self):
+        self.programs = 0
+        self.active = 0
+        self.reasons = dict.fromkeys(STOP_REASONS, 0)
+        self.opcodes = Counter()  # Opcodes span the whole instruction word above 16 bytes of memory
+        self.tstates = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+
+
+class Metrics:
+    """Registry of thread-local shards, merged on export"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()  # Only taken when a thread makes its first shard
+        self.started = time.time()
+        self._tstates = {}  # Per memory size and early reset; a racing thread at worst builds one twice
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def instrument(self, simulator):
+        """Count every instruction the simulator retires, and its T-states, into the calling thread's shard"""
+        shard = self.shard()
+        opcodes = shard.opcodes
+        # The machine's own T-states per opcode, early reset included
+        key = (simulator.memory_size, simulator.early_reset)
+        tstates = self._tstates.get(key)
+        if tstates is None:
+            tstates = self._tstates[key] = simulator.tstate_table()
+        bits = simulator.address_bits
+
+        def count(sim):
+            opcode = sim.IR >> bits
+            opcodes[opcode] += 1
+            shard.tstates += tstates[opcode]
+
+        simulator.add_hook('after_instruction', count)
+        return count
+
+    def run(self, simulator, max_instructions=20, **options):
+        """simulator.run() with its latency, stop reason and instructions recorded"""
+        shard = self.shard()
+        hook = self.instrument(simulator)
+        shard.active += 1
+        start = time.perf_counter()
+        try:
+            return simulator.run(max_instructions, **options)
+        finally:
+            elapsed = time.perf_counter() - start
+            shard.active -= 1
+            simulator.remove_hook('after_instruction', hook)
+            shard.programs += 1
+            if simulator.stop_reason in shard.reasons:
+                shard.reasons[simulator.stop_reason] += 1
+            shard.latency_sum += elapsed
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    shard.latency_buckets[i] += 1
+                    break
+
+    def snapshot(self):
+        """Merged totals across every thread"""
+        with self.lock:
+            shards = list(self.shards)
+        opcodes = Counter()
+        for shard in shards:
+            opcodes.update(dict(shard.opcodes))  # dict() copies in one step while the owner keeps counting
+        buckets = [sum(shard.latency_buckets[i] for shard in shards) for i in range(len(LATENCY_BUCKETS))]
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'programs': sum(shard.programs for shard in shards),
+            'active': sum(shard.active for shard in shards),
+            'stop_reasons': {reason: sum(shard.reasons[reason] for shard in shards) for reason in STOP_REASONS},
+            'instructions': sum(opcodes.values()),
+            'tstates': sum(shard.tstates for shard in shards),
+            'opcodes': {f"{op:X}": count for op, count in sorted(opcodes.items())},
+            'latency_buckets': buckets,
+            'latency_sum': sum(shard.latency_sum for shard in shards),
+            'latency_percentiles': {f"p{p}": percentile(buckets, p) for p in PERCENTILES},
+        }
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        totals = self.snapshot()
+        lines = [
+            "# HELP sap1_programs_total Programs run to completion or a stop condition.",
+            "# TYPE sap1_programs_total counter",
+            f"sap1_programs_total {totals['programs']}",
+            "# HELP sap1_runs_total Runs by stop reason.",
+            "# TYPE sap1_runs_total counter",
+        ]
+        lines += [f'sap1_runs_total{{reason="{reason}"}} {count}'
+                  for reason, count in totals['stop_reasons'].items()]
+        lines += [
+            "# HELP sap1_instructions_total Instructions retired.",
+            "# TYPE sap1_instructions_total counter",
+            f"sap1_instructions_total {totals['instructions']}",
+            "# HELP sap1_tstates_total T-states executed.",
+            "# TYPE sap1_tstates_total counter",
+            f"sap1_tstates_total {totals['tstates']}",
+            "# HELP sap1_opcode_instructions_total Instructions retired per opcode.",
+            "# TYPE sap1_opcode_instructions_total counter",
+        ]
+        lines += [f'sap1_opcode_instructions_total{{opcode="{op}"}} {count}'
+                  for op, count in totals['opcodes'].items()]
+        lines += [
+            "# HELP sap1_active_runs Runs in progress.",
+            "# TYPE sap1_active_runs gauge",
+            f"sap1_active_runs {totals['active']}",
+            "# HELP sap1_run_seconds Host time per run().",
+            "# TYPE sap1_run_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, totals['latency_buckets']):
+            cumulative += count
+            label = "+Inf" if bound == float('inf') else f"{bound:g}"
+            lines.append(f'sap1_run_seconds_bucket{{le="{label}"}} {cumulative}')
+        lines.append(f"sap1_run_seconds_sum {totals['latency_sum']:.9f}")
+        lines.append(f"sap1_run_seconds_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics from a daemon thread; returns the HTTP server"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def dump_json(self, path):
+        # Write then rename so readers never see a half-written file
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(self.snapshot(), handle, indent=2)
+        os.replace(temporary, path)
+
+    def dump_periodically(self, path, interval=10.0):
+        """Rewrite path with the JSON snapshot every interval seconds from a daemon thread"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.dump_json(path)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+
+def percentile(buckets, p):
+    """Upper bound of the bucket holding the p-th percentile run, or None with no runs"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = total * p / 100
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, buckets):
+        cumulative += count
+        if cumulative >= rank:
+            return bound if bound != float('inf') else LATENCY_BUCKETS[-2]
+    return LATENCY_BUCKETS[-2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run random SAP-1 programs with metrics exported")
+    parser.add_argument("--programs", type=int, default=100000, help="programs to run (default: 100000)")
+    parser.add_argument("--workers", type=int, default=4, help="worker threads (default: 4)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the program stream (default: 0)")
+    parser.add_argument("--memory-size", type=int, default=16)
+    parser.add_argument("--early-reset", action="store_true", help="run the machines with early ring-counter reset")
+    parser.add_argument("--port", type=int, help="serve Prometheus text on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--json", help="rewrite this JSON file with the totals every --interval seconds")
+    parser.add_argument("--interval", type=float, default=10.0, help="JSON dump interval (default: 10)")
+    parser.add_argument("--linger", action="store_true", help="keep serving after the programs finish")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    if args.port:
+        metrics.serve(args.port)
+        print(f"Serving http://127.0.0.1:{args.port}/metrics", file=sys.stderr)
+    if args.json:
+        metrics.dump_periodically(args.json, args.interval)
+
+    def work(worker):
+        pool = Final.SimulatorPool(max_size=1, memory_size=args.memory_size, early_reset=args.early_reset)
+        for index in range(worker, args.programs, args.workers):
+            sim = pool.acquire(random_image(args.seed, index))
+            metrics.run(sim)
+            pool.release(sim)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(work, range(args.workers)))
+
+    if args.json:
+        metrics.dump_json(args.json)
+    totals = metrics.snapshot()
+    print(f"{totals['programs']} programs, {totals['instructions']} instructions, "
+          f"{totals['tstates']} T-states; stop reasons {totals['stop_reasons']}; "
+          f"latency {totals['latency_percentiles']}")
+
+    if args.linger and args.port:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
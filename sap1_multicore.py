@@ -0,0 +1,314 @@
+"""Several SAP-1 cores sharing one memory and one W-bus, with pluggable bus arbitration.
+
+Every core is a Final engine whose memory is the shared bytearray. The
+bus use of each opcode's T-states (Ep, Ei, Ea/Eu, or memory driving it for
+Li/La/Lb) comes from sap1_vcd.microcode(), which traces the engine's own
+fetch_cycle/execute_cycle steps. Each clock cycle the arbiter grants the
+bus to one requesting core. The others stall and repeat their T-state.
+T-states that leave the bus alone (T3 decode, LDA's T6, OUT's T5/T6 and
+HLT's T4) never wait.
+
+The ISA has no store, so cores only ever read the shared memory. An
+instruction's net effect is applied (fast_step) when its last T-state
+completes, which gives the same registers as stepping it T-state by
+T-state.
+
+The loop is event-driven. Each opcode's T-states are boiled down to the
+bus-free gaps after each bus T-state. Waiting cores are a bitmask, and
+cores in a gap sleep in a heap until they next need the bus, so each
+cycle costs one grant however many cores there are.
+
+With no jumps or stores in the ISA, bus timing depends only on where each
+core's PC is, never on data. So whenever the first running core wraps to
+address 0, the loop notes the whole timing state: every core's PC and
+micro-step, who sleeps until when, the request mask and the arbiter's
+state_key(). How long a core has waited only adds to its stalls, so it is
+left out. Once a state repeats, the stretch between the two is periodic. The loop jumps whole periods at once: it scales the counters and
+runs each core's instructions on the engine with the trace JIT. Arbiters
+without state_key() are stepped cycle by cycle throughout.
+
+    python sap1_multicore.py --cores 4 --arbiter round-robin --cycles 100000
+    python sap1_multicore.py 192a3be0f0000000000a050200000000 --cores 16 --arbiter priority
+"""
+import argparse
+import heapq
+import sys
+import time
+
+from sap1_variants import README_IMAGE, load_variant, parse_image
+from sap1_vcd import microcode
+
+Final = load_variant('final')
+
+# Timing states remembered while looking for a period before starting afresh
+PERIOD_STATES = 4096
+
+# The README program with HLT replaced by NOP, so it wraps around memory forever
+LOOP_IMAGE = README_IMAGE[:4] + b"\x00" + README_IMAGE[5:]
+
+
+class RoundRobinArbiter:
+    """Grants the bus to the next requesting core after the last one granted"""
+
+    name = 'round-robin'
+
+    def __init__(self):
+        self.last = -1
+
+    def grant(self, requests):
+        """Pick a core from a bitmask of requesting core numbers"""
+        above = requests >> (self.last + 1) << (self.last + 1)
+        pick = above or requests
+        self.last = (pick & -pick).bit_length() - 1
+        return self.last
+
+    def state_key(self):
+        """Everything future grants depend on besides the requests"""
+        return self.last
+
+
+class FixedPriorityArbiter:
+    """Always grants the lowest-numbered requesting core"""
+
+    name = 'priority'
+
+    def grant(self, requests):
+        return (requests & -requests).bit_length() - 1
+
+    def state_key(self):
+        return None  # Stateless
+
+
+ARBITERS = {arbiter.name: arbiter for arbiter in (RoundRobinArbiter, FixedPriorityArbiter)}
+
+
+class Core:
+    """One CPU's engine and counters"""
+
+    __slots__ = ('number', 'simulator', 'instructions', 'stalls', 'bus_cycles', 'halted_at')
+
+    def __init__(self, number, simulator):
+        self.number = number
+        self.simulator = simulator
+        self.instructions = 0
+        self.stalls = 0
+        self.bus_cycles = 0
+        self.halted_at = None  # Cycle the core's HLT completed
+
+
+class MultiCore:
+    """N cores on one shared memory and bus"""
+
+    def __init__(self, image, cores=2, arbiter='round-robin', memory_size=16, starts=None):
+        if not 1 <= cores <= 64:
+            raise ValueError("cores must be from 1 to 64")
+        self.memory = None
+        self.cores = []
+        for number in range(cores):
+            sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False,
+                                      mode='instruction', jit=True)
+            if self.memory is None:
+                sim.load_image(image)
+                self.memory = sim.memory
+            sim.memory = self.memory  # One bytearray behind every core
+            if starts is not None:
+                sim.PC = starts[number] & sim.address_mask
+            self.cores.append(Core(number, sim))
+        self.arbiter = ARBITERS[arbiter]() if isinstance(arbiter, str) else arbiter
+        # Opcode -> bus-free cycles after each of its bus T-states. The last entry is the
+        # tail before the instruction completes, stored as ~tail so it is told apart by its
+        # sign. Every instruction starts with T1 (Ep) on the bus.
+        steps = microcode(memory_size)
+        self.gaps = [None] * len(steps)
+        for opcode, frames in steps.items():
+            gaps = []
+            for _, _, _, bus in frames:
+                if bus is not None:
+                    gaps.append(0)
+                else:
+                    gaps[-1] += 1
+            gaps[-1] = ~gaps[-1]
+            self.gaps[opcode] = tuple(gaps)
+        self.cycles = 0
+        self.bus_busy = 0
+
+        # Per core: gaps of the instruction in flight, its next bus T-state, cycle it asked for the bus
+        self.plans = [self.plan(core.simulator) for core in self.cores]
+        self.steps = [0] * cores
+        self.asked = [0] * cores
+        self.requests = 0  # Bitmask of cores waiting for the bus
+        self.sleeping = [(0, number) for number in range(cores)]  # (cycle, core) heap of cores in gaps
+
+    def plan(self, sim):
+        """Gaps of the instruction at sim's PC"""
+        word = sim.memory[sim.PC] if sim.instruction_bytes == 1 else sim.read_word(sim.PC)
+        return self.gaps[word >> sim.address_bits]
+
+    def run(self, cycles):
+        """Advance the shared clock by up to cycles; stops early once every core has halted"""
+        cores = self.cores
+        plans = self.plans
+        steps = self.steps
+        asked = self.asked
+        sleeping = self.sleeping
+        requests = self.requests
+        grant = self.arbiter.grant
+        simulators = [core.simulator for core in cores]
+        memory = self.memory
+        table = self.gaps
+        bits = simulators[0].address_bits
+        narrow = simulators[0].instruction_bytes == 1
+        plan = self.plan
+        stalls = [0] * len(cores)
+        granted = [0] * len(cores)
+        completed = [0] * len(cores)
+        now = self.cycles
+        end = now + cycles
+        never = end + 1
+        wake = sleeping[0][0] if sleeping else never  # Cycle the first sleeper needs the bus
+
+        # Timing states seen when the reference core (the first one running) wrapped to address 0
+        arbiter_key = getattr(self.arbiter, 'state_key', None)
+        seen = {}
+        reference = next((core.number for core in cores if core.halted_at is None), None)
+        due = False
+        while now < end:
+            if due:
+                due = False
+                # How long a core has waited only feeds its stall count, so it is left out of the key
+                # (a starved core would otherwise never repeat) and counted into the stalls instead
+                key = (requests, arbiter_key(), tuple(sorted((ready - now, number) for ready, number in sleeping)),
+                       tuple((sim.PC, step) for sim, step in zip(simulators, steps)))
+                stalled = tuple(stalls[number] + (now - asked[number] if requests >> number & 1 else 0)
+                                for number in range(len(cores)))
+                previous = seen.get(key)
+                if previous is None:
+                    if len(seen) >= PERIOD_STATES:
+                        seen.clear()
+                    seen[key] = (now, stalled, tuple(granted), tuple(completed))
+                else:
+                    then, *counts = previous
+                    period = now - then
+                    repeats = (end - now) // period
+                    if repeats:
+                        # Every core does in each period exactly what it did in this one
+                        for number, sim in enumerate(simulators):
+                            stalls[number] += repeats * (stalled[number] - counts[0][number])
+                            granted[number] += repeats * (granted[number] - counts[1][number])
+                            instructions = completed[number] - counts[2][number]
+                            if instructions:
+                                completed[number] += repeats * instructions
+                                sim.run(repeats * instructions)
+                        shift = repeats * period
+                        now += shift
+                        for number in range(len(cores)):
+                            if requests >> number & 1:
+                                asked[number] += shift
+                        sleeping[:] = [(ready + shift, number) for ready, number in sleeping]  # Still a heap
+                        wake = sleeping[0][0] if sleeping else never
+                        seen.clear()
+                        continue
+            if wake <= now:
+                while sleeping and sleeping[0][0] <= now:
+                    ready, number = heapq.heappop(sleeping)
+                    asked[number] = ready
+                    requests |= 1 << number
+                wake = sleeping[0][0] if sleeping else never
+            if not requests:
+                if not sleeping:
+                    break  # Every core has halted
+                now = min(wake, end)
+                continue
+
+            number = grant(requests)
+            stalls[number] += now - asked[number]
+            granted[number] += 1
+            now += 1
+            step = steps[number]
+            gap = plans[number][step]
+            if gap >= 0:
+                steps[number] = step + 1
+                ready = now + gap
+            else:
+                # The instruction completes after its tail; apply it and look up the next one
+                ready = now + ~gap
+                completed[number] += 1
+                sim = simulators[number]
+                if sim.fast_step():
+                    cores[number].halted_at = ready
+                    requests &= ~(1 << number)
+                    if number == reference:
+                        reference = next((core.number for core in cores if core.halted_at is None), None)
+                        seen.clear()  # Timing states from before the halt never come back
+                    continue
+                plans[number] = table[memory[sim.PC] >> bits] if narrow else plan(sim)
+                steps[number] = 0
+                if number == reference and not sim.PC and arbiter_key is not None:
+                    due = True
+            if ready == now:
+                asked[number] = now  # Wants the bus again next cycle
+            else:
+                requests &= ~(1 << number)
+                heapq.heappush(sleeping, (ready, number))
+                if ready < wake:
+                    wake = ready
+
+        for core, stalled, bus_cycles, instructions in zip(cores, stalls, granted, completed):
+            core.instructions += instructions
+            core.stalls += stalled
+            core.bus_cycles += bus_cycles
+            self.bus_busy += bus_cycles
+        if not requests and not sleeping:
+            # The last HLT may finish in bus-free T-states after the last grant
+            now = max([now] + [core.halted_at for core in cores if core.halted_at is not None])
+        # Cores still waiting have stalled up to the end of the run
+        for number in range(len(cores)):
+            if requests >> number & 1:
+                cores[number].stalls += now - asked[number]
+                asked[number] = now
+        self.requests = requests
+        self.cycles = now
+        return now
+
+    def report(self, file=None):
+        file = file or sys.stdout
+        cycles = self.cycles
+        print(f"{len(self.cores)} cores, {self.arbiter.name} arbiter, {cycles} cycles, "
+              f"bus utilisation {self.bus_busy / cycles:.1%}" if cycles else "No cycles run", file=file)
+        print(f"  {'core':>4} {'instructions':>12} {'CPI':>7} {'stalls':>9} {'bus':>9}  halted", file=file)
+        for core in self.cores:
+            active = core.halted_at if core.halted_at is not None else cycles
+            cpi = active / core.instructions if core.instructions else float('nan')
+            halted = core.halted_at if core.halted_at is not None else '-'
+            print(f"  {core.number:>4} {core.instructions:>12} {cpi:>7.2f} {core.stalls:>9} "
+                  f"{core.bus_cycles:>9}  {halted}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SAP-1 cores on a shared memory and bus")
+    parser.add_argument("image", nargs="?", help="memory image in hex (default: the README program looping)")
+    parser.add_argument("--cores", type=int, default=4, help="number of cores (default: 4)")
+    parser.add_argument("--arbiter", choices=sorted(ARBITERS), default="round-robin")
+    parser.add_argument("--cycles", type=int, default=100000, help="clock cycles to run (default: 100000)")
+    parser.add_argument("--stagger", action="store_true",
+                        help="start core i at instruction i instead of every core at address 0")
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size) if args.image else LOOP_IMAGE
+    starts = None
+    if args.stagger:
+        width = Final.SAP1Simulator(interactive=False, memory_size=args.memory_size,
+                                    verbose=False).instruction_bytes
+        starts = [number * width for number in range(args.cores)]
+    machine = MultiCore(image, args.cores, args.arbiter, args.memory_size, starts)
+    start = time.perf_counter()
+    machine.run(args.cycles)
+    elapsed = time.perf_counter() - start
+    machine.report()
+    print(f"Simulated {machine.cycles / elapsed / 1000:,.0f} cycles/ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Per-opcode profiler for the Final SAP-1 engine, built on its hook API.
+
+Attaching a Profiler registers T-state and instruction hooks; it counts
+instructions, T-states, idle T-states and control-line activity per opcode
+and times every micro-step on the host clock. A simulator without hooks
+runs the plain class and pays nothing for any of this.
+
+    python SAP-1-Sim-Final.py --profile
+    python sap1_profile.py 192a3be0f0000000000a050200000000 --max-instructions 1000
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+
+from sap1_variants import README_IMAGE, discard_output, load_variant, parse_image
+
+Final = load_variant('final')
+
+BAR_WIDTH = 40
+
+
+class Profiler:
+    """Collects per-opcode statistics from a simulator's hooks until detached"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.instructions = Counter()   # opcode -> instructions retired
+        self.tstates = Counter()        # opcode -> T-states spent (fetch included)
+        self.idle_tstates = Counter()   # opcode -> T-states with every control line low
+        self.signals = Counter()        # control line -> T-states it was high
+        self.host_time = Counter()      # micro-step ('FETCH T1', 'ADD T5', ...) -> seconds
+        self.host_calls = Counter()
+        self.started = None
+        # T-states of the instruction in flight, credited to its opcode once it retires
+        self.pending_tstates = 0
+        self.pending_idle = 0
+        self.attach()
+
+    def attach(self):
+        sim = self.simulator
+        sim.add_hook('before_tstate', self.before_tstate)
+        sim.add_hook('after_tstate', self.after_tstate)
+        sim.add_hook('after_instruction', self.after_instruction)
+
+    def detach(self):
+        sim = self.simulator
+        sim.remove_hook('before_tstate', self.before_tstate)
+        sim.remove_hook('after_tstate', self.after_tstate)
+        sim.remove_hook('after_instruction', self.after_instruction)
+
+    def before_tstate(self, sim):
+        self.started = time.perf_counter()
+
+    def after_tstate(self, sim):
+        elapsed = time.perf_counter() - self.started
+        opcode = sim.IR >> sim.address_bits
+        if sim.t_state <= 3:
+            step = f"FETCH T{sim.t_state}"
+        else:
+            step = f"{sim.instructions.get(opcode, 'UNK')} T{sim.t_state}"
+        self.host_time[step] += elapsed
+        self.host_calls[step] += 1
+
+        self.pending_tstates += 1
+        active = [signal for signal, value in sim.control_signals.items() if value]
+        if not active:
+            self.pending_idle += 1
+        self.signals.update(active)
+
+    def after_instruction(self, sim):
+        opcode = sim.IR >> sim.address_bits
+        self.instructions[opcode] += 1
+        self.tstates[opcode] += self.pending_tstates
+        self.idle_tstates[opcode] += self.pending_idle
+        self.pending_tstates = self.pending_idle = 0
+
+    def report(self, file=None):
+        """Print the histograms"""
+        file = file or sys.stdout
+        names = self.simulator.instructions
+
+        print("\nPROFILE", file=file)
+        print("=" * 60, file=file)
+        total = sum(self.instructions.values())
+        print(f"Instructions: {total}", file=file)
+        for opcode, count in self.instructions.most_common():
+            print(f"  {names.get(opcode, f'UNK {opcode:X}'):<6} {count:>9} {bar(count, total)}", file=file)
+
+        total = sum(self.tstates.values())
+        print(f"\nT-states: {total} ({sum(self.idle_tstates.values())} with no control line high)",
+              file=file)
+        for opcode, count in self.tstates.most_common():
+            print(f"  {names.get(opcode, f'UNK {opcode:X}'):<6} {count:>9} "
+                  f"idle {self.idle_tstates[opcode]:>7} {bar(count, total)}", file=file)
+
+        print("\nControl lines (T-states high):", file=file)
+        for signal in Final.CONTROL_SIGNALS:
+            print(f"  {signal:<6} {self.signals[signal]:>9} {bar(self.signals[signal], total)}", file=file)
+
+        total = sum(self.host_time.values())
+        print(f"\nHost time per micro-step: {total * 1e3:.3f} ms", file=file)
+        for step, seconds in self.host_time.most_common():
+            calls = self.host_calls[step]
+            print(f"  {step:<10} {seconds * 1e3:>9.3f} ms {seconds / calls * 1e9:>8.0f} ns/call "
+                  f"{bar(seconds, total)}", file=file)
+
+
+def bar(value, total):
+    return "#" * round(BAR_WIDTH * value / total) if total else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile one SAP-1 program on the Final engine")
+    parser.add_argument("image", nargs="?", help="memory image in hex (default: the README program)")
+    parser.add_argument("--max-instructions", type=int, default=20,
+                        help="stop after this many instructions, 0 for no limit (default: 20)")
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size) if args.image else README_IMAGE
+    sim = Final.SAP1Simulator(interactive=False, memory_size=args.memory_size, verbose=False)
+    sim.load_image(image)
+    profiler = Profiler(sim)
+    with discard_output():
+        sim.run(max_instructions=args.max_instructions or None)
+    profiler.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
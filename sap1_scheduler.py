@@ -0,0 +1,204 @@
+"""Round-robin scheduler hosting many independent SAP-1 machines in one process.
+
+Each session (one per student, say) owns a quiet instruction-mode Final
+engine. Every round, each ready session is credited quantum x priority
+units, in T-states or instructions, and runs whole instructions while its
+credit lasts. The overshoot of the last instruction is carried into the
+next round as a debt (deficit round robin), so machines get their exact
+share over time. The engine cannot stop inside an instruction, so this is
+the finest interleaving it allows.
+
+Sessions may carry a T-state budget. A session that halts, exhausts its
+budget or is parked leaves the ready queue, and rounds never touch it
+again. An idle machine is its simulator plus a slotted Session, a little
+over 1 KB.
+
+    python sap1_scheduler.py --machines 10000 --quantum 12 --rounds 50
+    python sap1_scheduler.py --machines 500 --unit instruction --budget 3000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+from sap1_fuzz import random_image
+from sap1_variants import load_variant
+
+Final = load_variant('final')
+
+# Session states
+READY, HALTED, EXHAUSTED, PARKED = 'ready', 'halted', 'exhausted', 'parked'
+
+
+class Session:
+    """One hosted machine and its scheduling state"""
+
+    __slots__ = ('name', 'simulator', 'priority', 'budget', 'tstates', 'instructions', 'credit', 'state',
+                 'costs')
+
+    def __init__(self, name, simulator, priority=1, budget=None):
+        if priority < 1:
+            raise ValueError("priority must be at least 1")
+        self.name = name
+        self.simulator = simulator
+        self.priority = priority
+        self.budget = budget  # T-states the session may use in total, None for no limit
+        self.tstates = 0
+        self.instructions = 0
+        self.credit = 0
+        self.state = READY
+        self.costs = None
+
+
+class Scheduler:
+    """Weighted round robin over sessions; unit is 'tstate' or 'instruction'"""
+
+    def __init__(self, quantum=12, unit='tstate'):
+        if unit not in ('tstate', 'instruction'):
+            raise ValueError(f"unknown quantum unit: {unit}")
+        self.quantum = quantum
+        self.unit = unit
+        self.sessions = {}
+        self.ready = deque()
+        self.rounds = 0
+        self._costs = {}  # Shared per memory size
+
+    def add(self, image, name=None, priority=1, budget=None, memory_size=16):
+        """Host a new machine with image loaded; returns its Session"""
+        sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False, mode='instruction')
+        sim.load_image(image)
+        name = len(self.sessions) if name is None else name
+        if name in self.sessions:
+            raise ValueError(f"session {name!r} already exists")
+        session = Session(name, sim, priority, budget)
+        costs = self._costs.get(memory_size)
+        if costs is None:
+            costs = self._costs[memory_size] = sim.tstate_table()
+        session.costs = costs
+        self.sessions[name] = session
+        self.ready.append(session)
+        return session
+
+    def remove(self, name):
+        session = self.sessions.pop(name)
+        if session.state == READY:
+            self.ready.remove(session)
+        return session
+
+    def park(self, name):
+        """Take a ready session off the ready queue until wake()"""
+        session = self.sessions[name]
+        if session.state == READY:
+            self.ready.remove(session)
+            session.state = PARKED
+
+    def wake(self, name, budget=None):
+        """Requeue a parked or budget-exhausted session, optionally with a new budget"""
+        session = self.sessions[name]
+        if budget is not None:
+            session.budget = budget
+        if session.state in (PARKED, EXHAUSTED):
+            session.state = READY
+            session.credit = 0
+            self.ready.append(session)
+
+    def run_round(self):
+        """Give every ready session its quantum; returns the T-states executed"""
+        ready = self.ready
+        by_tstate = self.unit == 'tstate'
+        executed = 0
+        for _ in range(len(ready)):
+            session = ready.popleft()
+            sim = session.simulator
+            memory = sim.memory
+            costs = session.costs
+            bits = sim.address_bits
+            budget = session.budget
+            tstates = session.tstates
+            instructions = session.instructions
+            credit = session.credit + self.quantum * session.priority
+            state = READY
+            while credit > 0:
+                # Peek at the next opcode to charge it before it runs
+                word = memory[sim.PC] if sim.instruction_bytes == 1 else sim.read_word(sim.PC)
+                cost = costs[word >> bits]
+                if budget is not None and tstates + cost > budget:
+                    state = EXHAUSTED
+                    break
+                halted = sim.fast_step()
+                tstates += cost
+                instructions += 1
+                credit -= cost if by_tstate else 1
+                if halted:
+                    state = HALTED
+                    break
+            executed += tstates - session.tstates
+            session.tstates = tstates
+            session.instructions = instructions
+            session.state = state
+            session.credit = credit if state == READY else 0
+            if state == READY:
+                ready.append(session)
+        self.rounds += 1
+        return executed
+
+    def run(self, rounds=None):
+        """Run rounds until no session is ready or rounds have run; returns the T-states executed"""
+        executed = 0
+        count = 0
+        while self.ready and (rounds is None or count < rounds):
+            executed += self.run_round()
+            count += 1
+        return executed
+
+    def counts(self):
+        """Sessions per state"""
+        counts = dict.fromkeys((READY, HALTED, EXHAUSTED, PARKED), 0)
+        for session in self.sessions.values():
+            counts[session.state] += 1
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many SAP-1 machines under a round-robin scheduler")
+    parser.add_argument("--machines", type=int, default=1000, help="machines to host (default: 1000)")
+    parser.add_argument("--quantum", type=int, default=12,
+                        help="units per round at priority 1 (default: 12)")
+    parser.add_argument("--unit", choices=("tstate", "instruction"), default="tstate")
+    parser.add_argument("--budget", type=int, help="T-state budget per machine (default: none)")
+    parser.add_argument("--priorities", default="1",
+                        help="comma-separated priorities assigned to machines in turn (default: 1)")
+    parser.add_argument("--rounds", type=int, default=100, help="rounds to run, 0 until all stop (default: 100)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random programs (default: 0)")
+    args = parser.parse_args()
+
+    priorities = [int(priority) for priority in args.priorities.split(',')]
+    tracemalloc.start()
+    scheduler = Scheduler(args.quantum, args.unit)
+    for index in range(args.machines):
+        scheduler.add(random_image(args.seed, index), priority=priorities[index % len(priorities)],
+                      budget=args.budget)
+    hosted = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{args.machines} machines hosted in {hosted / 2**20:.1f} MiB "
+          f"({hosted / args.machines:.0f} bytes each)")
+
+    start = time.perf_counter()
+    executed = scheduler.run(args.rounds or None)
+    elapsed = time.perf_counter() - start
+    print(f"{scheduler.rounds} rounds, {executed} T-states in {elapsed:.2f}s "
+          f"({executed / elapsed / 1e6:.2f}M T-states/s)")
+    print(f"Sessions: {scheduler.counts()}")
+
+    # Fairness: T-states per unit of priority among sessions still running
+    running = [session for session in scheduler.sessions.values() if session.state == READY]
+    if running:
+        shares = [session.tstates / session.priority for session in running]
+        print(f"T-states per priority unit among {len(running)} running: "
+              f"min {min(shares):.0f}, max {max(shares):.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""Long-lived SAP-1 simulation server with request batching.
+
+Clients send one JSON request per line over TCP or a Unix socket and get
+one JSON response per line back, tagged with the request id (responses on
+a connection may arrive out of order):
+
+    {"id": 1, "image": "192a3be0f0000000000a050200000000", "max_instructions": 20}
+    {"id": 1, "halted": true, "stop_reason": "halt", "pc": 5, "acc": 13, "out": 13}
+
+Each batch has a time limit. A program still running when it runs out,
+and every program of the batch not started yet, stops with stop_reason
+"timeout", so one slow batch cannot hold a worker for long. A request
+line longer than the read limit gets an error reply and ends the
+connection.
+
+Requests are queued and coalesced into micro-batches that run on the
+quiet instruction-mode engine with the trace JIT in a process pool. The
+queue is bounded: once it is full the server stops reading from clients
+until batches drain, and writes wait for slow readers.
+
+    python sap1_server.py serve --port 7301
+    python sap1_server.py load --port 7301 --connections 8 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sap1_fuzz import random_image
+from sap1_variants import load_variant, parse_image
+
+Final = load_variant('final')
+
+# Default largest instruction cap a request may ask for (serve --max-instructions)
+MAX_INSTRUCTIONS = 10_000_000
+
+# Default seconds a batch may run before its unfinished requests stop with stop_reason 'timeout'
+TIME_LIMIT = 1.0
+
+# Instructions run between time limit checks, tens of milliseconds at 64 KiB
+DEADLINE_SLICE = 65536
+
+# Longest request line read; a 64 KiB image as "0xff, " bytes plus the other fields
+REQUEST_LIMIT = 6 * 0x10000 + 4096
+
+
+# Worker-process simulators, one pool per memory size
+_pools = {}
+
+
+def run_program(image, max_instructions, memory_size, deadline=None):
+    pool = _pools.get(memory_size)
+    if pool is None:
+        pool = _pools[memory_size] = Final.SimulatorPool(memory_size=memory_size, mode='instruction', jit=True)
+    sim = pool.acquire(image)
+    halted = False
+    # Run in slices so the deadline is checked; run() carries on from where the last slice stopped
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            sim.stop_reason = 'timeout'
+            break
+        budget = min(max_instructions, DEADLINE_SLICE)
+        halted = sim.run(budget)
+        max_instructions -= budget
+        if halted or not max_instructions:
+            break
+    result = {'halted': halted, 'stop_reason': sim.stop_reason, 'pc': sim.PC, 'acc': sim.ACC, 'out': sim.OUT}
+    pool.release(sim)
+    return result
+
+
+def run_batch(programs, time_limit=None):
+    """Worker: run (image, max_instructions, memory_size) programs, each distinct one once, within time_limit"""
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    results = {}
+    for program in programs:
+        if program not in results:
+            results[program] = run_program(*program, deadline)
+    return [results[program] for program in programs]
+
+
+class RequestError(ValueError):
+    """A malformed request; request_id is its id when one could be read"""
+
+    def __init__(self, message, request_id=None):
+        super().__init__(message)
+        self.request_id = request_id
+
+
+def parse_request(line, instruction_cap=MAX_INSTRUCTIONS):
+    """Decode one request line into (id, program); raises RequestError when malformed"""
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as error:
+        raise RequestError(f"invalid JSON: {error}") from None
+    if not isinstance(request, dict) or 'image' not in request:
+        raise RequestError("request must be an object with an 'image'")
+    request_id = request.get('id')
+    memory_size = request.get('memory_size', 16)
+    max_instructions = request.get('max_instructions', 20)
+    # bool is an int subclass, but true is no instruction count
+    if type(max_instructions) is not int or not 1 <= max_instructions <= instruction_cap:
+        raise RequestError(f"max_instructions must be from 1 to {instruction_cap}", request_id)
+    if type(memory_size) is not int or not 16 <= memory_size <= 0x10000 or memory_size & (memory_size - 1):
+        raise RequestError("memory_size must be a power of two from 16 to 65536 bytes", request_id)
+    try:
+        image = parse_image(str(request['image']), memory_size)
+    except ValueError as error:
+        raise RequestError(f"bad image: {error}", request_id) from None
+    return request_id, (image, max_instructions, memory_size)
+
+
+class SimulationServer:
+    """Accepts requests on any number of listeners and feeds them to batch workers"""
+
+    def __init__(self, executor, workers, batch_size=256, batch_window=0.002, queue_size=4096,
+                 instruction_cap=MAX_INSTRUCTIONS, time_limit=TIME_LIMIT):
+        self.executor = executor
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.instruction_cap = instruction_cap
+        self.time_limit = time_limit
+        self.queue = asyncio.Queue(queue_size)
+        self.requests = 0
+        self.batches = 0
+
+    async def batcher(self):
+        """Take a request, wait up to batch_window for more, and run them as one batch"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Anything already queued joins the batch without waiting
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            programs = [program for program, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, run_batch, programs, self.time_limit)
+            except Exception as error:
+                results = [{'error': f"simulation failed: {error}"}] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self.batches += 1
+
+    async def handle(self, reader, writer):
+        """One client connection: queue each request line, answer as results arrive"""
+        loop = asyncio.get_running_loop()
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(request_id, future):
+            result = await future
+            async with write_lock:
+                writer.write(json.dumps({'id': request_id, **result}).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than REQUEST_LIMIT: what follows cannot be told apart from the
+                    # next request, so answer with an error and stop reading this client
+                    line, overrun = b'', True
+                else:
+                    overrun = False
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                try:
+                    if overrun:
+                        raise RequestError(f"request line longer than {REQUEST_LIMIT} bytes")
+                    request_id, program = parse_request(line, self.instruction_cap)
+                except RequestError as error:
+                    future = loop.create_future()
+                    future.set_result({'error': str(error)})
+                    request_id = error.request_id
+                else:
+                    future = loop.create_future()
+                    # Blocks while the queue is full, so this client is not read meanwhile
+                    await self.queue.put((program, future))
+                    self.requests += 1
+                task = asyncio.ensure_future(respond(request_id, future))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                if overrun:
+                    break
+            if pending:
+                await asyncio.gather(*pending)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host=None, port=None, unix=None):
+        batchers = [asyncio.ensure_future(self.batcher()) for _ in range(self.workers)]
+        servers = []
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle, host, port, limit=REQUEST_LIMIT))
+            print(f"Listening on {host}:{port}", file=sys.stderr)
+        if unix:
+            servers.append(await asyncio.start_unix_server(self.handle, unix, limit=REQUEST_LIMIT))
+            print(f"Listening on {unix}", file=sys.stderr)
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers))
+        finally:
+            for task in batchers:
+                task.cancel()
+            print(f"{self.requests} requests in {self.batches} batches", file=sys.stderr)
+
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def load_client(args, connection, latencies):
+    """Send this connection's share of the requests with up to --pipeline in flight"""
+    reader, writer = await open_connection(args)
+    window = asyncio.Semaphore(args.pipeline)
+    sent = {}
+
+    async def receive(count):
+        for _ in range(count):
+            response = json.loads(await reader.readline())
+            if 'error' in response:
+                raise RuntimeError(f"request {response['id']}: {response['error']}")
+            latencies.append(time.perf_counter() - sent.pop(response['id']))
+            window.release()
+
+    indices = range(connection, args.requests, args.connections)
+    receiver = asyncio.ensure_future(receive(len(indices)))
+    for index in indices:
+        await window.acquire()
+        request = {'id': index, 'image': random_image(args.seed, index).hex(),
+                   'max_instructions': args.max_instructions}
+        sent[index] = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+    await receiver
+    writer.close()
+
+
+async def generate_load(args):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(load_client(args, connection, latencies) for connection in range(args.connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests over {args.connections} connections in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f} requests/s)")
+    for p in (50, 90, 99, 99.9):
+        index = min(len(latencies) - 1, int(len(latencies) * p / 100))
+        print(f"  p{p:<5g} {latencies[index] * 1e3:8.2f} ms")
+    print(f"  max    {latencies[-1] * 1e3:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAP-1 simulation server and load generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="TCP port")
+    parser.add_argument("--unix", help="Unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the server")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                              help="worker processes (default: CPU count)")
+    serve_parser.add_argument("--batch-size", type=int, default=256, help="most requests per batch (default: 256)")
+    serve_parser.add_argument("--batch-window", type=float, default=2.0,
+                              help="milliseconds to wait for a batch to fill (default: 2)")
+    serve_parser.add_argument("--queue-size", type=int, default=4096,
+                              help="queued requests before clients are throttled (default: 4096)")
+    serve_parser.add_argument("--max-instructions", type=int, default=MAX_INSTRUCTIONS,
+                              help=f"largest instruction cap a request may ask for (default: {MAX_INSTRUCTIONS})")
+    serve_parser.add_argument("--time-limit", type=float, default=TIME_LIMIT,
+                              help=f"seconds a batch may run, 0 for no limit (default: {TIME_LIMIT:g})")
+
+    load_parser = commands.add_parser("load", help="measure a running server's latency and throughput")
+    load_parser.add_argument("--connections", type=int, default=8, help="client connections (default: 8)")
+    load_parser.add_argument("--requests", type=int, default=20000, help="total requests (default: 20000)")
+    load_parser.add_argument("--pipeline", type=int, default=64,
+                             help="requests in flight per connection (default: 64)")
+    load_parser.add_argument("--max-instructions", type=int, default=20)
+    load_parser.add_argument("--seed", type=int, default=0, help="seed for the program stream (default: 0)")
+
+    args = parser.parse_args()
+    if args.port is None and not args.unix:
+        parser.error("give --port and/or --unix")
+
+    if args.command == "serve" and (args.max_instructions < 1 or args.time_limit < 0):
+        parser.error("--max-instructions must be positive and --time-limit not negative")
+
+    if args.command == "load":
+        asyncio.run(generate_load(args))
+        return 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Start the workers before the event loop so none is forked from inside it
+        executor.submit(run_batch, []).result()
+        server = SimulationServer(executor, args.workers, args.batch_size,
+                                  args.batch_window / 1000, args.queue_size,
+                                  args.max_instructions, args.time_limit or None)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
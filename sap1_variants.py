@@ -0,0 +1,91 @@
+"""Load the SAP-1 simulator scripts in this directory by name.
+
+The simulators are standalone scripts (one has hyphens in its file name),
+so tools load them from their paths instead of importing them.
+"""
+import contextlib
+import importlib.util
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Variant name -> script file
+VARIANTS = {
+    'sap1': 'sap1.py',
+    'simulator': 'SAP1Simulator.py',
+    'revised': 'SAP1SIMREVISED.py',
+    'final': 'SAP-1-Sim-Final.py',
+    'integration': 'test-integration.py',
+}
+
+# The README walkthrough: LDA 9, ADD 10, SUB 11, OUT, HLT with 10, 5, 2 as data
+README_IMAGE = bytes([0x19, 0x2A, 0x3B, 0xE0, 0xF0, 0x00, 0x00, 0x00,
+                      0x00, 0x0A, 0x05, 0x02, 0x00, 0x00, 0x00, 0x00])
+
+_modules = {}
+
+
+def load_variant(name):
+    """Load (once) and return the module for a variant name"""
+    if name not in _modules:
+        path = os.path.join(HERE, VARIANTS[name])
+        spec = importlib.util.spec_from_file_location(f"sap1_variant_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+def make_simulator(name, image, quiet=False, **options):
+    """Build a non-interactive simulator of the named variant with image in memory.
+
+    Extra options go to the constructor (only the Final engine takes any).
+    quiet=True drops the per-T-state printout; run() banners still print,
+    so wrap run() in discard_output() for fully silent runs.
+    """
+    cls = load_variant(name).SAP1Simulator
+    if name == 'sap1':
+        sim = cls()  # Loads its built-in program, which the image replaces
+    else:
+        sim = cls(interactive=False, **options)
+
+    if hasattr(sim, 'load_image'):
+        sim.load_image(image)
+    else:
+        sim.memory = list(image)
+
+    if quiet:
+        if hasattr(sim, 'verbose'):
+            sim.verbose = False
+        else:
+            sim.print_state = _discard
+    return sim
+
+
+def _discard(*args):
+    pass
+
+
+class _NullWriter:
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def discard_output():
+    """Context manager that throws away everything printed inside it"""
+    return contextlib.redirect_stdout(_NullWriter())
+
+
+def parse_image(text, size=16):
+    """Parse a memory image from hex ('192A3BE0F0...') or space separated bytes"""
+    text = text.strip()
+    if ' ' in text or ',' in text:
+        values = [int(part, 0) for part in text.replace(',', ' ').split()]
+    else:
+        values = list(bytes.fromhex(text))
+    if len(values) > size:
+        raise ValueError(f"image has {len(values)} bytes, memory holds {size}")
+    return bytes(values) + bytes(size - len(values))
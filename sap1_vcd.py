@@ -0,0 +1,361 @@
+"""Value Change Dump export of SAP-1 runs, for GTKWave and other waveform viewers.
+
+Every T-state is one clock period. The dump has the clock, the T1-T6 ring
+counter (one-hot), the 12 CON lines, the bus and the PC/MAR/IR/ACC/TMP/OUT
+registers. Only changes are written, and output is streamed to disk in
+fixed-size chunks, so memory use does not grow with the run.
+
+VCDWriter.run() steps the machine at instruction level and expands each
+instruction into its T-states from a microcode table traced once from
+the engine's own cycle-accurate steps. This keeps long dumps near the
+speed of a plain cycle-mode run. A writer created with attach=True
+instead records every T-state through the simulator's hook, for runs
+driven by other code.
+
+    python sap1_vcd.py 192a3be0f0000000000a050200000000 -o readme.vcd
+    python SAP-1-Sim-Final.py --vcd run.vcd
+"""
+import argparse
+import sys
+
+from sap1_variants import README_IMAGE, load_variant, parse_image
+
+Final = load_variant('final')
+
+PERIOD = 10  # ns per T-state
+FLUSH_EVERY = 8192  # Pending chunks before a write
+
+REGISTERS = ('PC', 'MAR', 'IR', 'ACC', 'TMP', 'OUT')
+
+# Where a register's value comes from during an instruction
+BEFORE, AFTER, FETCH = 'before', 'after', 'fetch'
+
+_microcode = {}
+
+
+def identifiers():
+    """VCD short identifiers: '!', '"', '#', ..."""
+    code = 33
+    while True:
+        yield chr(code)
+        code += 1
+
+
+def bus_source(signals):
+    """Which unit drives the bus for a set of control signals, or None when it floats"""
+    if signals['Ep']:
+        return 'PC'
+    if signals['Ei']:
+        return 'ADDR'
+    if signals['Ea'] or signals['Eu']:
+        return 'ACC'  # ALU results are already latched into ACC
+    if signals['Li']:
+        return 'IR'  # Memory drives the fetched instruction
+    if signals['La'] or signals['Lb']:
+        return 'MEM'
+    return None
+
+
+def bus_value(source, registers, address_mask, memory):
+    """Value on the bus, with registers in REGISTERS order; None when it floats"""
+    if source is None:
+        return None
+    if source == 'PC':
+        return registers[0]
+    if source == 'ADDR':
+        return registers[2] & address_mask
+    if source == 'ACC':
+        return registers[3]
+    if source == 'IR':
+        return registers[2]
+    return memory[registers[1]]
+
+
+def microcode(memory_size, early_reset=False):
+    """Per opcode, the T-states one instruction passes through, traced from the engine.
+
+    Each entry is (t_state, control signals, register sources, bus source),
+    the register sources saying whether each register holds its value from
+    before the instruction, after it, or the fetch address.
+    """
+    key = (memory_size, early_reset)
+    if key in _microcode:
+        return _microcode[key]
+
+    table = {}
+    probe = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False)
+    # Wide instruction words leave room for opcodes past 0xF; they decode as undefined
+    for opcode in range(1 << (8 * probe.instruction_bytes - probe.address_bits)):
+        sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False,
+                                  early_reset=early_reset)
+        # Distinct values everywhere, so each register's source can be told apart
+        pc, operand = 1, 8
+        sim.write_word(pc, (opcode << sim.address_bits) | operand)
+        sim.memory[operand] = 0x33
+        sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT = pc, 7, 0, 0x11, 0x22, 0x44
+        before = (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT)
+
+        seen = []
+        sim.add_hook('after_tstate', lambda sim: seen.append(
+            (sim.t_state, tuple(sim.control_signals[signal] for signal in Final.CONTROL_SIGNALS),
+             (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT), bus_source(sim.control_signals))))
+        sim.step_instruction()
+        after = (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT)
+
+        frames = []
+        for t_state, signals, values, bus in seen:
+            sources = tuple(BEFORE if value == before[i] else FETCH if i == 1 and value == pc else AFTER
+                            for i, value in enumerate(values))
+            if any(source == AFTER and values[i] != after[i] for i, source in enumerate(sources)):
+                raise RuntimeError(f"opcode {opcode:X} T{t_state}: register holds an intermediate value")
+            frames.append((t_state, signals, sources, bus))
+        table[opcode] = frames
+
+    _microcode[key] = table
+    return table
+
+
+class VCDWriter:
+    """Streams a simulator's T-states to a VCD file"""
+
+    def __init__(self, path, simulator, attach=False):
+        self.simulator = simulator
+        self.handle = open(path, "w", buffering=1 << 20)
+        self.pending = []
+        self.time = 0
+        self.tstates = 0
+
+        codes = identifiers()
+        self.clock_code = next(codes)
+        self.ring_code = next(codes)
+        self.signal_codes = [next(codes) for _ in Final.CONTROL_SIGNALS]
+        self.bus_code = next(codes)
+        self.register_codes = [next(codes) for _ in REGISTERS]
+
+        sim = simulator
+        instruction_bits = 8 * sim.instruction_bytes
+        self.register_widths = (sim.address_bits, sim.address_bits, instruction_bits, 8, 8, 8)
+        self.bus_width = instruction_bits
+
+        self.last_t_state = sim.t_state
+        self.last_signals = tuple(sim.control_signals[signal] for signal in Final.CONTROL_SIGNALS)
+        self.last_bus = None
+        self.last_registers = [sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT]
+        self.memory = sim.memory_view()  # The ISA never stores, so a read-only view is all the bus needs
+        self.write_header()
+
+        self.attached = attach
+        if attach:
+            sim.add_hook('after_tstate', self.on_tstate)
+
+    def write_header(self):
+        lines = [
+            "$version SAP-1 simulator (sap1_vcd.py) $end",
+            "$timescale 1ns $end",
+            "$scope module sap1 $end",
+            f"$var wire 1 {self.clock_code} clk $end",
+            f"$var wire 6 {self.ring_code} T $end",
+        ]
+        lines += [f"$var wire 1 {code} {signal} $end"
+                  for code, signal in zip(self.signal_codes, Final.CONTROL_SIGNALS)]
+        lines.append(f"$var wire {self.bus_width} {self.bus_code} bus $end")
+        lines += [f"$var wire {width} {code} {name} $end"
+                  for code, width, name in zip(self.register_codes, self.register_widths, REGISTERS)]
+        lines += ["$upscope $end", "$enddefinitions $end", "#0", "$dumpvars", f"0{self.clock_code}",
+                  f"b{ring(self.last_t_state)} {self.ring_code}"]
+        lines += [f"{value}{code}" for code, value in zip(self.signal_codes, self.last_signals)]
+        lines.append(f"bz {self.bus_code}")
+        lines += [f"b{value:b} {code}" for code, value in zip(self.register_codes, self.last_registers)]
+        lines.append("$end")
+        self.handle.write("\n".join(lines) + "\n")
+
+    def on_tstate(self, sim):
+        """after_tstate hook: write the T-state the simulator just finished"""
+        self.time += PERIOD
+        self.tstates += 1
+        out = self.pending
+        out.append(f"#{self.time}\n1{self.clock_code}\n")
+        state = (sim.t_state, tuple(sim.control_signals.values()))  # CON order
+        out.append(self.transition((self.last_t_state, self.last_signals), state))
+        self.last_t_state, self.last_signals = state
+
+        registers = self.last_registers
+        for index, value in enumerate((sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT)):
+            if value != registers[index]:
+                registers[index] = value
+                out.append(f"b{value:b} {self.register_codes[index]}\n")
+
+        bus = bus_value(bus_source(sim.control_signals), registers, sim.address_mask, self.memory)
+        if bus != self.last_bus:
+            self.last_bus = bus
+            out.append(f"bz {self.bus_code}\n" if bus is None else f"b{bus:b} {self.bus_code}\n")
+
+        out.append(f"#{self.time + PERIOD // 2}\n0{self.clock_code}\n")
+        if len(out) >= FLUSH_EVERY:
+            self.flush()
+
+    def run(self, max_instructions=20):
+        """Run the simulator at instruction level, writing every T-state; returns True on HLT.
+
+        Falls back to a hooked cycle-mode run() when the writer is attached,
+        other hooks are registered or the simulator prints its trace, since
+        those expect real T-states.
+        """
+        sim = self.simulator
+        if self.attached or sim.hook_base is not None or sim.verbose:
+            mode = sim.mode
+            sim.set_mode('cycle')
+            if not self.attached:
+                sim.add_hook('after_tstate', self.on_tstate)
+            try:
+                return sim.run(max_instructions)
+            finally:
+                sim.set_mode(mode)
+                if not self.attached:
+                    sim.remove_hook('after_tstate', self.on_tstate)
+
+        table = self.compile(microcode(sim.memory_size, sim.early_reset))
+        heads = {}  # (previous opcode, opcode) -> changes going into the first T-state
+        previous = None
+        registers = self.last_registers
+        memory = self.memory
+        bits = sim.address_bits
+        out = self.pending
+        append = out.append
+        bus_code = self.bus_code
+        clock_high = f"\n1{self.clock_code}\n"
+        clock_low = f"\n0{self.clock_code}\n"
+        half = PERIOD // 2
+        time = self.time
+        last_bus = self.last_bus
+        halt = False
+        count = 0
+        while not halt and (max_instructions is None or count < max_instructions):
+            before = (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT)
+            halt = sim.fast_step()
+            count += 1
+            values = (before, (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT))
+            opcode = sim.IR >> bits
+            frames, first, _ = table[opcode]
+
+            text = heads.get((previous, opcode))
+            if text is None:
+                text = self.transition(table[previous][2] if previous is not None
+                                       else (self.last_t_state, self.last_signals), first)
+                if previous is not None:
+                    heads[previous, opcode] = text
+            previous = opcode
+
+            for changes, bus_register, bus_mask, next_text in frames:
+                time += PERIOD
+                append(f"#{time}{clock_high}{text}")
+                for index, code, which, column in changes:
+                    value = values[which][column]
+                    if value != registers[index]:
+                        registers[index] = value
+                        append(f"b{value:b} {code}\n")
+                if bus_register is None:
+                    bus = None
+                elif bus_register < 0:
+                    bus = memory[registers[1]]
+                else:
+                    bus = registers[bus_register] & bus_mask
+                if bus != last_bus:
+                    last_bus = bus
+                    append(f"bz {bus_code}\n" if bus is None else f"b{bus:b} {bus_code}\n")
+                append(f"#{time + half}{clock_low}")
+                text = next_text
+            self.tstates += len(frames)
+            if len(out) >= FLUSH_EVERY:
+                self.flush()
+        self.time = time
+        self.last_bus = last_bus
+
+        # Leave the machine as a cycle-mode run would
+        if previous is not None:
+            self.last_t_state, self.last_signals = table[previous][2]
+        sim.t_state = self.last_t_state
+        for signal, value in zip(Final.CONTROL_SIGNALS, self.last_signals):
+            sim.control_signals[signal] = value
+        sim.stop_reason = 'halt' if halt else 'limit'
+        return halt
+
+    def compile(self, microcode):
+        """Per opcode: (frames, first (t_state, signals), last (t_state, signals)).
+
+        A frame is (register updates as (index, code, before/after, column),
+        bus register and mask, changes going into the next T-state).
+        """
+        bus_sources = {None: (None, 0), 'PC': (0, -1), 'ADDR': (2, self.simulator.address_mask),
+                       'ACC': (3, -1), 'IR': (2, -1), 'MEM': (-1, 0)}
+        table = {}
+        for opcode, frames in microcode.items():
+            compiled = []
+            previous_sources = (BEFORE,) * len(REGISTERS)
+            for number, (t_state, signals, sources, bus) in enumerate(frames):
+                changes = []
+                for index, (source, old) in enumerate(zip(sources, previous_sources)):
+                    if source != old:
+                        which, column = (0, 0) if source == FETCH else (int(source == AFTER), index)
+                        changes.append((index, self.register_codes[index], which, column))
+                previous_sources = sources
+                next_text = None
+                if number + 1 < len(frames):
+                    next_text = self.transition((t_state, signals), frames[number + 1][:2])
+                compiled.append((tuple(changes), *bus_sources[bus], next_text))
+            table[opcode] = (compiled, frames[0][:2], frames[-1][:2])
+        return table
+
+    def transition(self, old, new):
+        """Ring counter and control line changes between two (t_state, signals) pairs"""
+        text = f"b{ring(new[0])} {self.ring_code}\n" if new[0] != old[0] else ""
+        if new[1] != old[1]:
+            text += "".join(f"{value}{code}\n" for code, value, before
+                            in zip(self.signal_codes, new[1], old[1]) if value != before)
+        return text
+
+    def flush(self):
+        self.handle.write("".join(self.pending))
+        self.pending.clear()
+
+    def close(self):
+        """Detach from the simulator and finish the file"""
+        if self.attached:
+            self.simulator.remove_hook('after_tstate', self.on_tstate)
+            self.attached = False
+        self.flush()
+        self.handle.write(f"#{self.time + PERIOD}\n")
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ring(t_state):
+    """T-state as the 6-bit one-hot ring counter (T1 = 000001), 0 before the first clock"""
+    return f"{1 << (t_state - 1):b}" if t_state else "0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a SAP-1 run as a VCD waveform")
+    parser.add_argument("image", nargs="?", help="memory image in hex (default: the README program)")
+    parser.add_argument("-o", "--output", default="sap1.vcd", help="VCD file to write (default: sap1.vcd)")
+    parser.add_argument("--max-instructions", type=int, default=20,
+                        help="stop after this many instructions, 0 for no limit (default: 20)")
+    parser.add_argument("--memory-size", type=int, default=16)
+    args = parser.parse_args()
+
+    image = parse_image(args.image, args.memory_size) if args.image else README_IMAGE
+    sim = Final.SAP1Simulator(interactive=False, memory_size=args.memory_size, verbose=False)
+    sim.load_image(image)
+    with VCDWriter(args.output, sim) as vcd:
+        vcd.run(max_instructions=args.max_instructions or None)
+    print(f"{vcd.tstates} T-states written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
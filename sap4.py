@@ -1,6 +1,22 @@
-import pygame
+import argparse
+import json
+import os
 import sys
 import time
+import queue
+import struct
+import threading
+import types
+from array import array
+from collections import namedtuple
+
+# Replays run headless; SDL picks its video driver when pygame initialises below
+if any(arg.startswith("--replay") for arg in sys.argv[1:]):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from sap1_clock import MAX_HZ, MIN_HZ, Clock
 
 # Initialize Pygame
 pygame.init()
@@ -29,8 +45,26 @@ font = pygame.font.SysFont('consolas', 16)
 title_font = pygame.font.SysFont('consolas', 24)
 small_font = pygame.font.SysFont('consolas', 14)
 
+# Snapshot layout shared with SAP-1-Sim-Final.py at 16 bytes of memory:
+# memory, PC, MAR, IR, ACC, TMP, OUT, T-state, control word (Cp is bit 11)
+STATE = struct.Struct('<16sBBBBBBBH')
+SIGNALS = ('Cp', 'Ep', 'Lm', 'Ce', 'Li', 'Ei', 'La', 'Ea', 'Su', 'Eu', 'Lb', 'Lo')
+
 class SAP1Simulator:
-    def __init__(self):
+    __slots__ = ('PC', 'MAR', 'ACC', 'IR', 'TMP', 'OUT', 'memory', 'control_signals', 't_state',
+                 'program_image', 'fetch_counts', 'read_counts')
+
+    # Instruction mapping (opcode to mnemonic), shared by every instance
+    instructions = {
+        0x0: 'NOP',
+        0x1: 'LDA',
+        0x2: 'ADD',
+        0x3: 'SUB',
+        0xE: 'OUT',
+        0xF: 'HLT'
+    }
+
+    def __init__(self, program_image=None):
         # Initialize all registers to zero (all zeroes)
         self.PC = 0    # Program Counter
         self.MAR = 0   # Memory Address Register
@@ -39,8 +73,8 @@ class SAP1Simulator:
         self.TMP = 0   # Temporary Register
         self.OUT = 0   # Output Register
         
-        # 16-byte memory for 
-        self.memory = [0] * 16
+        # 16-byte memory, filled in place so views handed out by memory_view() stay live
+        self.memory = bytearray(16)
         
         # Control signals (all initially off)
         self.control_signals = {
@@ -51,18 +85,45 @@ class SAP1Simulator:
         # Current T-state
         self.t_state = 0
         
-        # Instruction mapping (opcode to mnemonic)
-        self.instructions = {
-            0x0: 'NOP',
-            0x1: 'LDA',
-            0x2: 'ADD',
-            0x3: 'SUB',
-            0xE: 'OUT',
-            0xF: 'HLT'
-        }
+        # Per-cell access counts since reset: instruction fetches (T2) and operand reads (T5)
+        self.fetch_counts = [0] * 16
+        self.read_counts = [0] * 16
         
-        # Initialize memory with user program
-        self.initialize_memory_with_user_input()
+        # Initialize memory with user program, kept so reset() can reload it without prompting
+        if program_image is None:
+            self.initialize_memory_with_user_input()
+        else:
+            self.memory[:] = bytes(program_image)  # A recorded session's program
+        self.program_image = tuple(self.memory)
+
+    def memory_view(self):
+        """Read-only zero-copy view of memory for the renderer"""
+        return memoryview(self.memory).toreadonly()
+
+    def reset(self):
+        """Return to the power-on state in place with the entered program reloaded"""
+        self.PC = self.MAR = self.ACC = self.IR = self.TMP = self.OUT = 0
+        self.memory[:] = self.program_image
+        self.reset_control_signals()
+        self.t_state = 0
+        self.fetch_counts[:] = self.read_counts[:] = [0] * 16
+
+    def snapshot(self):
+        """Machine state as a 25-byte blob (registers are stored as 8-bit values)"""
+        word = 0
+        for signal in SIGNALS:
+            word = (word << 1) | self.control_signals[signal]
+        return STATE.pack(bytes(self.memory), self.PC & 0xFF, self.MAR & 0xFF, self.IR & 0xFF,
+                          self.ACC & 0xFF, self.TMP & 0xFF, self.OUT & 0xFF, self.t_state, word)
+
+    def restore(self, blob):
+        """Load a snapshot() blob"""
+        if len(blob) != STATE.size:
+            raise ValueError(f"snapshot is {len(blob)} bytes, expected {STATE.size} for 16 bytes of memory")
+        memory, self.PC, self.MAR, self.IR, self.ACC, self.TMP, self.OUT, self.t_state, word = STATE.unpack(blob)
+        self.memory[:] = memory
+        for bit, signal in enumerate(reversed(SIGNALS)):
+            self.control_signals[signal] = (word >> bit) & 1
     
     def get_user_input(self):
         """Get program instructions and data from user"""
@@ -162,7 +223,7 @@ class SAP1Simulator:
         program_input, data_input = self.get_user_input()
         
         # Clear memory
-        self.memory = [0] * 16
+        self.memory[:] = bytes(16)
         
         # Parse program instructions
         opcode_map = {'LDA': 0x1, 'ADD': 0x2, 'SUB': 0x3, 'OUT': 0xE, 'HLT': 0xF, 'NOP': 0x0}
@@ -176,7 +237,7 @@ class SAP1Simulator:
             if opcode_str in opcode_map:
                 if opcode_str in ['LDA', 'ADD', 'SUB'] and len(parts) > 1:
                     try:
-                        mem_addr = int(parts[1])
+                        mem_addr = int(parts[1]) & 0x0F
                         self.memory[addr] = (opcode_map[opcode_str] << 4) | mem_addr
                     except ValueError:
                         self.memory[addr] = opcode_map[opcode_str] << 4
@@ -186,7 +247,7 @@ class SAP1Simulator:
         # Load data values
         for addr, value in data_input.items():
             if addr < 16:
-                self.memory[addr] = value
+                self.memory[addr] = value & 0xFF  # Mask to 8 bits
     
     def reset_control_signals(self):
         """Turn off all control signals"""
@@ -221,7 +282,8 @@ class SAP1Simulator:
         self.control_signals['Ce'] = 1  # Enable PC increment
         self.control_signals['Li'] = 1  # Load IR from bus
         self.IR = self.memory[self.MAR]  # Memory puts value on bus, IR loads it
-        self.PC += 1  # PC increments
+        self.fetch_counts[self.MAR] += 1
+        self.PC = (self.PC + 1) & 0x0F  # PC increments, wrapping like the 4-bit counter it is
         
         # T3: Decode instruction (no control signals needed)
         self.t_state = 3
@@ -245,6 +307,7 @@ class SAP1Simulator:
             self.reset_control_signals()
             self.control_signals['La'] = 1  # Load ACC from bus
             self.ACC = self.memory[self.MAR]  # Memory puts value on bus
+            self.read_counts[self.MAR] += 1
             
             # T6: No operation
             self.t_state = 6
@@ -263,6 +326,7 @@ class SAP1Simulator:
             self.reset_control_signals()
             self.control_signals['Lb'] = 1  # Load TMP from bus
             self.TMP = self.memory[self.MAR]  # Memory puts value on bus
+            self.read_counts[self.MAR] += 1
             
             # T6: ACC <- ACC + TMP
             self.t_state = 6
@@ -270,7 +334,7 @@ class SAP1Simulator:
             self.control_signals['Ea'] = 1  # Put ACC on bus
             self.control_signals['Eu'] = 1  # Put ALU result on bus
             self.control_signals['La'] = 1  # Load ACC from bus
-            self.ACC += self.TMP  # ALU performs addition
+            self.ACC = (self.ACC + self.TMP) & 0xFF  # ALU performs 8-bit addition
             
         elif opcode == 0x3:  # SUB - Subtract from Accumulator
             # T4: MAR <- address from IR
@@ -285,6 +349,7 @@ class SAP1Simulator:
             self.reset_control_signals()
             self.control_signals['Lb'] = 1  # Load TMP from bus
             self.TMP = self.memory[self.MAR]  # Memory puts value on bus
+            self.read_counts[self.MAR] += 1
             
             # T6: ACC <- ACC - TMP
             self.t_state = 6
@@ -293,7 +358,7 @@ class SAP1Simulator:
             self.control_signals['Eu'] = 1  # Put ALU result on bus
             self.control_signals['La'] = 1  # Load ACC from bus
             self.control_signals['Su'] = 1  # Set ALU to subtract mode
-            self.ACC -= self.TMP  # ALU performs subtraction
+            self.ACC = (self.ACC - self.TMP) & 0xFF  # ALU performs 8-bit subtraction
             
         elif opcode == 0xE:  # OUT - Output Accumulator
             # T4: OUT <- ACC
@@ -319,16 +384,269 @@ class SAP1Simulator:
             
         return False
 
-class SAP1Visualizer:
-    def __init__(self, simulator):
+# Immutable view of the machine handed from the simulation thread to the renderer
+MachineSnapshot = namedtuple('MachineSnapshot', [
+    'PC', 'MAR', 'ACC', 'IR', 'TMP', 'OUT', 't_state', 'control_signals',
+    'memory', 'fetch_counts', 'read_counts', 'mnemonic', 'con', 'step', 'auto_advance', 'clock_hz',
+    'achieved_hz', 'breakpoint', 'error'
+])
+
+class SimulationWorker(threading.Thread):
+    """Runs the simulator off the render thread and publishes snapshots"""
+    def __init__(self, simulator, breakpoints=None, clock_hz=1.0, timer=time.perf_counter):
+        super().__init__(daemon=True)
         self.simulator = simulator
+        self.breakpoints = breakpoints  # sap1_debug.Breakpoints, checked after every step
+        self.hit = None  # Label of the breakpoint the last step stopped on
+        self.error = None  # What stopped the worker when a command or step raised, until reset
+        self.commands = queue.SimpleQueue()
+        self.current_step = 0
+        self.clock = Clock(clock_hz, timer=timer)  # Auto-advance steps per second
+        self.auto_advance = False
+        self.checkpoint = None
+        self.latest = None
+        self.publish()
+    
+    def publish(self):
+        """Freeze the current machine state into the single snapshot slot"""
+        sim = self.simulator
+        # Rebinding one attribute is atomic, so the renderer never sees a half-written state
+        self.latest = MachineSnapshot(
+            PC=sim.PC, MAR=sim.MAR, ACC=sim.ACC, IR=sim.IR, TMP=sim.TMP, OUT=sim.OUT,
+            t_state=sim.t_state,
+            control_signals=types.MappingProxyType(dict(sim.control_signals)),
+            memory=sim.memory_view(),  # The ISA never stores, so memory only changes on reset or load
+            fetch_counts=tuple(sim.fetch_counts),
+            read_counts=tuple(sim.read_counts),
+            mnemonic=sim.instructions.get(sim.IR >> 4, 'UNK'),
+            con=sim.print_control_sequence(),
+            step=self.current_step,
+            auto_advance=self.auto_advance,
+            clock_hz=self.clock.hz,
+            achieved_hz=self.clock.achieved() if self.auto_advance else None,
+            breakpoint=self.hit,
+            error=self.error
+        )
+    
+    def send(self, command):
+        """Queue a command from the UI thread"""
+        self.commands.put(command)
+    
+    def run(self):
+        while True:
+            # Sleep until the next command, or until the next auto-advance step is due
+            timeout = None
+            if self.auto_advance:
+                timeout = self.clock.until_next()
+            try:
+                command = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+            
+            if command == "stop":
+                return
+            try:
+                self.handle(command)
+                self.advance()
+            except Exception as error:
+                # Show it and stop auto-advance rather than let the thread die with the UI waiting on it
+                self.error = f"{type(error).__name__}: {error}"
+                self.auto_advance = False
+            self.publish()
+    
+    def poll(self):
+        """Apply queued commands and due steps on the caller's thread, as a replay does"""
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            self.handle(command)
+        self.advance()
+        self.publish()
+    
+    def handle(self, command):
+        """Apply one UI command"""
+        if command == "step":
+            self.step_simulation()
+        elif command == "auto":
+            self.auto_advance = not self.auto_advance
+            if self.auto_advance:
+                self.clock.restart()  # No backlog owed for the time spent paused
+        elif command == "reset":
+            self.reset_simulation()
+        elif command == "save":
+            # The heatmap counters ride along outside the blob, which keeps Final's layout
+            sim = self.simulator
+            self.checkpoint = (sim.snapshot(), self.current_step, tuple(sim.fetch_counts), tuple(sim.read_counts))
+        elif command == "load" and self.checkpoint:
+            blob, self.current_step, fetches, reads = self.checkpoint
+            self.simulator.restore(blob)
+            self.simulator.fetch_counts[:] = fetches
+            self.simulator.read_counts[:] = reads
+            self.auto_advance = False
+            self.rearm()
+        elif command == "faster":
+            self.clock.set_frequency(min(MAX_HZ, self.clock.hz / 0.7))
+        elif command == "slower":
+            self.clock.set_frequency(max(MIN_HZ, self.clock.hz * 0.7))
+    
+    def advance(self):
+        """Auto-advance if enabled, catching up on every step that has come due"""
+        if self.auto_advance:
+            for _ in range(self.clock.due()):
+                self.step_simulation()
+                if not self.auto_advance:
+                    break
+    
+    def step_simulation(self):
+        if self.simulator.t_state == 0:
+            self.simulator.fetch_cycle()
+        elif self.simulator.t_state == 3:
+            halt = self.simulator.execute_cycle()
+            if halt:
+                self.auto_advance = False
+        elif self.simulator.t_state == 6:
+            self.simulator.t_state = 0
+        else:
+            if self.simulator.t_state < 3:
+                self.simulator.fetch_cycle()
+            else:
+                self.simulator.execute_cycle()
+        
+        self.current_step += 1
+        
+        # Breakpoints stop auto-advance on the step that satisfies them
+        self.hit = None
+        if self.breakpoints is not None:
+            hit = self.breakpoints.check(self.simulator)
+            if hit is not None:
+                self.hit = self.breakpoints.labels[hit]
+                self.auto_advance = False
+    
+    def rearm(self):
+        """Restart watchpoints from the current state after a jump in time"""
+        self.hit = None
+        if self.breakpoints is not None:
+            self.breakpoints.arm(self.simulator)
+    
+    def reset_simulation(self):
+        self.simulator.reset()
         self.current_step = 0
-        self.execution_speed = 1.0  # seconds per step
-        self.last_step_time = 0
         self.auto_advance = False
-        self.execution_history = []
+        self.error = None
+        self.rearm()
+
+# Recorded events and the attributes handle_events reads from them
+RECORDED_EVENTS = {
+    'QUIT': (),
+    'VIDEORESIZE': ('size',),
+    'KEYDOWN': ('key',),
+    'MOUSEBUTTONDOWN': ('button', 'pos'),
+}
+
+# Panels whose cost a replay reports
+DRAW_METHODS = ('draw_register', 'draw_bus', 'draw_memory', 'draw_alu', 'draw_control_matrix',
+                'draw_output_panel', 'draw_instructions', 'draw_buttons')
+
+class SessionRecorder:
+    """Writes a session as JSON lines: a header with the program, then each frame's time and input events"""
+    def __init__(self, path, simulator, settings):
+        self.file = open(path, 'w')
+        self.names = {getattr(pygame, name): name for name in RECORDED_EVENTS}
+        header = {'program': list(simulator.program_image), **settings}
+        self.file.write(json.dumps(header) + "\n")
+        self.start = time.perf_counter()
+    
+    def frame(self, events):
+        recorded = []
+        for event in events:
+            name = self.names.get(event.type)
+            if name:
+                recorded.append([name, {attr: getattr(event, attr) for attr in RECORDED_EVENTS[name]}])
+        self.file.write(json.dumps([round(time.perf_counter() - self.start, 6), recorded]) + "\n")
+    
+    def close(self):
+        self.file.close()
+
+def load_session(path):
+    """Read a recorded session; returns its header and [(time, [pygame events])] frames"""
+    with open(path) as handle:
+        header = json.loads(handle.readline())
+        frames = []
+        for line in handle:
+            when, recorded = json.loads(line)
+            events = [pygame.event.Event(getattr(pygame, name),
+                                         {attr: tuple(value) if isinstance(value, list) else value
+                                          for attr, value in attrs.items()})
+                      for name, attrs in recorded]
+            frames.append((when, events))
+    return header, frames
+
+class FrameProfiler:
+    """Rolling frame, panel and step timings in fixed-size ring buffers, for the overlay"""
+    def __init__(self, history=120):
+        self.history = history
+        self.position = 0
+        self.frames = 0
+        self.frame_times = array('d', [0.0]) * history  # Seconds of work per frame
+        self.intervals = array('d', [0.0]) * history    # Seconds between frames, for FPS
+        self.panels = {name: array('d', [0.0]) * history for name in DRAW_METHODS}
+        self.pending = {name: [0, 0.0] for name in DRAW_METHODS}  # This frame's (calls, seconds)
+        self.step_times = array('d', [0.0]) * history
+        self.steps = 0
+        self.last_end = None
+        self.saved = {}
+    
+    def attach(self, visualizer):
+        """Time visualizer's panels and its worker's steps until detach()"""
+        self.saved = {name: visualizer.__dict__.get(name) for name in DRAW_METHODS}
+        for name in DRAW_METHODS:
+            setattr(visualizer, name, timed(getattr(visualizer, name), self.pending[name]))
+        
+        step = visualizer.worker.step_simulation
+        def timed_step():
+            start = time.perf_counter()
+            step()
+            self.step_times[self.steps % self.history] = time.perf_counter() - start
+            self.steps += 1
+        visualizer.worker.step_simulation = timed_step
+    
+    def detach(self, visualizer):
+        """Put back the methods attach() wrapped"""
+        for name, method in self.saved.items():
+            if method is None:
+                delattr(visualizer, name)
+            else:
+                setattr(visualizer, name, method)
+        del visualizer.worker.step_simulation
+    
+    def end_frame(self, seconds):
+        """Move this frame's timings into the rings"""
+        now = time.perf_counter()
+        position = self.position
+        self.frame_times[position] = seconds
+        self.intervals[position] = now - self.last_end if self.last_end is not None else seconds
+        self.last_end = now
+        for name, cost in self.pending.items():
+            self.panels[name][position] = cost[1]
+            cost[0] = 0
+            cost[1] = 0.0
+        self.position = (position + 1) % self.history
+        self.frames += 1
+    
+    def average(self, ring, count):
+        filled = min(count, self.history)
+        return sum(ring) / filled if filled else 0.0
+
+class SAP1Visualizer:
+    def __init__(self, simulator, breakpoints=None, clock_hz=1.0):
+        self.worker = SimulationWorker(simulator, breakpoints, clock_hz)
+        self.state = self.worker.latest
         self.memory_view_start = 0
         self.show_help = False
+        self.profiler = None  # FrameProfiler while the overlay is shown
+        self.buttons = []  # (name, rect) of the buttons last drawn, for hit-testing clicks
         self.screen_width, self.screen_height = SCREEN_WIDTH, SCREEN_HEIGHT
         
     def scale_value(self, value, is_width=True):
@@ -395,6 +713,8 @@ class SAP1Visualizer:
         cell_height = self.scale_value(30, False)
         cells_x = x + 10
         cells_y = y + 50
+        totals = [fetch + read for fetch, read in zip(self.state.fetch_counts, self.state.read_counts)]
+        hottest = max(totals) or 1
         
         for i in range(16):
             addr = self.memory_view_start + i
@@ -404,12 +724,20 @@ class SAP1Visualizer:
                 screen.blit(addr_text, (cells_x, cells_y + i * cell_height))
                 
                 # Draw memory value
-                value = self.simulator.memory[addr]
+                value = self.state.memory[addr]
                 value_text = font.render(f"{value:02X}", True, BLUE)
                 screen.blit(value_text, (cells_x + 50, cells_y + i * cell_height))
                 
+                # Heatmap cell: white when untouched, red for the most accessed, with fetches/reads
+                if totals[addr]:
+                    shade = 255 - 205 * totals[addr] // hottest
+                    pygame.draw.rect(screen, (255, shade, shade), (cells_x + 90, cells_y + i * cell_height, 90, 20))
+                    counts_text = small_font.render(
+                        f"{self.state.fetch_counts[addr]}/{self.state.read_counts[addr]}", True, BLACK)
+                    screen.blit(counts_text, (cells_x + 95, cells_y + i * cell_height + 2))
+                
                 # Highlight current MAR address
-                if addr == self.simulator.MAR:
+                if addr == self.state.MAR:
                     pygame.draw.rect(screen, YELLOW, 
                                     (cells_x + 45, cells_y + i * cell_height, 30, 20), 2)
         
@@ -442,22 +770,22 @@ class SAP1Visualizer:
         screen.blit(alu_text, (x + (width - alu_text.get_width()) // 2, y + 10))
         
         # Draw operation
-        op = "SUB" if self.simulator.control_signals.get('Su', 0) else "ADD"
+        op = "SUB" if self.state.control_signals.get('Su', 0) else "ADD"
         op_text = font.render(f"Operation: {op}", True, BLUE)
         screen.blit(op_text, (x + 10, y + 40))
         
         # Draw inputs
-        acc_text = font.render(f"ACC: {self.simulator.ACC:02X}h", True, DARK_BLUE)
+        acc_text = font.render(f"ACC: {self.state.ACC:02X}h", True, DARK_BLUE)
         screen.blit(acc_text, (x + 10, y + 70))
         
-        tmp_text = font.render(f"TMP: {self.simulator.TMP:02X}h", True, DARK_BLUE)
+        tmp_text = font.render(f"TMP: {self.state.TMP:02X}h", True, DARK_BLUE)
         screen.blit(tmp_text, (x + 10, y + 90))
         
         # Draw result
-        if self.simulator.control_signals.get('Su', 0):
-            result = self.simulator.ACC - self.simulator.TMP
+        if self.state.control_signals.get('Su', 0):
+            result = (self.state.ACC - self.state.TMP) & 0xFF
         else:
-            result = self.simulator.ACC + self.simulator.TMP
+            result = (self.state.ACC + self.state.TMP) & 0xFF
             
         result_text = font.render(f"Result: {result:02X}h", True, GREEN)
         screen.blit(result_text, (x + 10, y + 120))
@@ -497,7 +825,7 @@ class SAP1Visualizer:
         
         y_pos = y + 40
         for signal, description in signals:
-            color = GREEN if self.simulator.control_signals.get(signal, 0) else RED
+            color = GREEN if self.state.control_signals.get(signal, 0) else RED
             signal_text = font.render(f"{signal}: {description}", True, color)
             screen.blit(signal_text, (x + 10, y_pos))
             y_pos += 25
@@ -520,15 +848,22 @@ class SAP1Visualizer:
         screen.blit(title_text, (x + (width - title_text.get_width()) // 2, y + 10))
         
         # Draw output in different formats
-        dec_text = font.render(f"Decimal: {self.simulator.OUT}", True, BLUE)
+        dec_text = font.render(f"Decimal: {self.state.OUT}", True, BLUE)
         screen.blit(dec_text, (x + 10, y + 40))
         
-        hex_text = font.render(f"Hexadecimal: {self.simulator.OUT:02X}h", True, BLUE)
+        hex_text = font.render(f"Hexadecimal: {self.state.OUT:02X}h", True, BLUE)
         screen.blit(hex_text, (x + 10, y + 70))
         
-        bin_text = font.render(f"Binary: {self.simulator.OUT:08b}", True, BLUE)
+        bin_text = font.render(f"Binary: {self.state.OUT:08b}", True, BLUE)
         screen.blit(bin_text, (x + 10, y + 100))
         
+        # Draw the auto-advance clock, and the rate it is keeping while running
+        clock_line = f"Clock: {self.state.clock_hz:.3g} Hz"
+        if self.state.achieved_hz is not None:
+            clock_line += f" (actual {self.state.achieved_hz:.3g})"
+        clock_text = font.render(clock_line, True, DARK_BLUE)
+        screen.blit(clock_text, (x + 10, y + 130))
+        
         return pygame.Rect(x, y, width, height)
     
     def draw_instructions(self, x, y, width, height):
@@ -547,25 +882,35 @@ class SAP1Visualizer:
         screen.blit(title_text, (x + (width - title_text.get_width()) // 2, y + 10))
         
         # Draw current instruction
-        opcode = self.simulator.IR >> 4
-        address = self.simulator.IR & 0x0F
-        instruction = self.simulator.instructions.get(opcode, 'UNK')
+        opcode = self.state.IR >> 4
+        address = self.state.IR & 0x0F
+        instruction = self.state.mnemonic
         
         instr_text = font.render(f"Current: {instruction} {address if address else ''}", True, BLUE)
         screen.blit(instr_text, (x + 10, y + 40))
         
         # Draw T-state
-        tstate_text = font.render(f"T-State: T{self.simulator.t_state}", True, GREEN)
+        tstate_text = font.render(f"T-State: T{self.state.t_state}", True, GREEN)
         screen.blit(tstate_text, (x + 10, y + 70))
         
         # Draw PC
-        pc_text = font.render(f"Program Counter: {self.simulator.PC:02X}h", True, DARK_BLUE)
+        pc_text = font.render(f"Program Counter: {self.state.PC:02X}h", True, DARK_BLUE)
         screen.blit(pc_text, (x + 10, y + 100))
         
         # Draw control sequence
-        con_text = font.render(f"CON: {self.simulator.print_control_sequence()}", True, PURPLE)
+        con_text = font.render(f"CON: {self.state.con}", True, PURPLE)
         screen.blit(con_text, (x + 10, y + 130))
         
+        # Draw the breakpoint that stopped the last step
+        if self.state.breakpoint:
+            break_text = font.render(f"Hit: {self.state.breakpoint}", True, RED)
+            screen.blit(break_text, (x + 10, y + 160))
+        
+        # Draw what stopped the worker, if a step failed
+        if self.state.error:
+            error_text = font.render(f"Stopped: {self.state.error}", True, RED)
+            screen.blit(error_text, (x + 10, y + 190))
+        
         return pygame.Rect(x, y, width, height)
     
     def draw_buttons(self):
@@ -587,7 +932,7 @@ class SAP1Visualizer:
         buttons.append(("step", step_rect))
         
         # Auto button
-        auto_color = ORANGE if self.auto_advance else BLUE
+        auto_color = ORANGE if self.state.auto_advance else BLUE
         auto_rect = pygame.Rect(self.scale_value(20) + button_width + button_spacing, button_y, button_width, button_height)
         pygame.draw.rect(screen, auto_color, auto_rect)
         pygame.draw.rect(screen, BLACK, auto_rect, 2)
@@ -660,7 +1005,11 @@ class SAP1Visualizer:
             "- Step: Execute one T-state",
             "- Auto: Automatically execute T-states",
             "- Reset: Reset the simulator",
-            "- +/-: Adjust execution speed",
+            "- +/-: Adjust the auto-advance clock",
+            "- S / L: Save a checkpoint / return to it",
+            "- --break EXPR / --watch EXPR: Stop auto-advance on a condition",
+            "- P: Show / hide the frame profiler",
+            "- --record / --replay PATH: Capture a session, or benchmark it headless",
             "",
             "ARCHITECTURE COMPONENTS:",
             "- Program Counter (PC): Holds the address of the next instruction",
@@ -681,7 +1030,59 @@ class SAP1Visualizer:
             screen.blit(text_surface, (help_rect.x + 20, y_pos))
             y_pos += 25
     
+    def toggle_profiler(self):
+        if self.profiler:
+            self.profiler.detach(self)
+            self.profiler = None
+        else:
+            self.profiler = FrameProfiler()
+            self.profiler.attach(self)
+    
+    def draw_profiler(self):
+        # Draw the profiler overlay at a fixed size in the lower right
+        profiler = self.profiler
+        width, height = 400, 290
+        x, y = self.screen_width - width - 20, self.screen_height - height - 70
+        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+        overlay.fill((255, 255, 255, 220))
+        screen.blit(overlay, (x, y))
+        pygame.draw.rect(screen, BLACK, (x, y, width, height), 2)
+        
+        frames = profiler.frames
+        frame_ms = profiler.average(profiler.frame_times, frames) * 1000
+        interval = profiler.average(profiler.intervals, frames)
+        fps = 1 / interval if interval else 0.0
+        lines = [
+            (f"FPS: {fps:.1f}   frame: {frame_ms:.2f} ms avg, {max(profiler.frame_times) * 1000:.2f} max", BLUE),
+            (f"step_simulation: {profiler.average(profiler.step_times, profiler.steps) * 1000:.3f} ms avg "
+             f"({profiler.steps} steps)", PURPLE),
+        ]
+        for name in DRAW_METHODS:
+            ring = profiler.panels[name]
+            lines.append((f"{name:<20} {profiler.average(ring, frames) * 1000:6.3f} ms  "
+                          f"max {max(ring) * 1000:6.3f}", DARK_BLUE))
+        for row, (text, color) in enumerate(lines):
+            screen.blit(small_font.render(text, True, color), (x + 10, y + 10 + row * 18))
+        
+        # Frame-time histogram, oldest on the left, against the 60 FPS budget
+        chart_y, chart_height = y + height - 70, 60
+        budget = 1 / 60
+        history, position, ring = profiler.history, profiler.position, profiler.frame_times
+        bar_width = (width - 20) / history
+        for index in range(history):
+            seconds = ring[(position + index) % history]  # Read the ring in place from its oldest slot
+            bar = min(chart_height, int(chart_height * seconds / (2 * budget)))
+            if bar:
+                color = RED if seconds > budget else GREEN
+                pygame.draw.rect(screen, color, (x + 10 + int(index * bar_width), chart_y + chart_height - bar,
+                                                 max(1, int(bar_width)), bar))
+        pygame.draw.line(screen, ORANGE, (x + 10, chart_y + chart_height // 2),
+                         (x + width - 10, chart_y + chart_height // 2), 1)
+    
     def draw(self):
+        # Always render the most recent snapshot published by the worker
+        self.state = self.worker.latest
+        
         # Clear screen
         screen.fill(WHITE)
         
@@ -690,29 +1091,29 @@ class SAP1Visualizer:
         screen.blit(title, (self.screen_width // 2 - title.get_width() // 2, 10))
         
         # Draw components
-        bus_rect = self.draw_bus(150, 100, self.screen_width - 300, 4, any(self.simulator.control_signals.values()))
+        bus_rect = self.draw_bus(150, 100, self.screen_width - 300, 4, any(self.state.control_signals.values()))
         
         # Left side components
-        pc_rect = self.draw_register(50, 150, 100, 80, "PC", self.simulator.PC, 
-                                    self.simulator.control_signals.get('Ep', 0))
-        mar_rect = self.draw_register(50, 250, 100, 80, "MAR", self.simulator.MAR, 
-                                     self.simulator.control_signals.get('Lm', 0))
-        acc_rect = self.draw_register(50, 450, 100, 80, "ACC", self.simulator.ACC, 
-                                     self.simulator.control_signals.get('La', 0) or 
-                                     self.simulator.control_signals.get('Ea', 0))
+        pc_rect = self.draw_register(50, 150, 100, 80, "PC", self.state.PC, 
+                                    self.state.control_signals.get('Ep', 0))
+        mar_rect = self.draw_register(50, 250, 100, 80, "MAR", self.state.MAR, 
+                                     self.state.control_signals.get('Lm', 0))
+        acc_rect = self.draw_register(50, 450, 100, 80, "ACC", self.state.ACC, 
+                                     self.state.control_signals.get('La', 0) or 
+                                     self.state.control_signals.get('Ea', 0))
         
         # Center components
         mem_rect = self.draw_memory(self.screen_width // 2 - 120, 150, 240, 300)
         alu_rect = self.draw_alu(self.screen_width // 2 - 80, 470, 160, 150)
         
         # Right side components
-        ir_rect = self.draw_register(self.screen_width - 150, 150, 100, 80, "IR", self.simulator.IR, 
-                                    self.simulator.control_signals.get('Li', 0) or 
-                                    self.simulator.control_signals.get('Ei', 0))
-        tmp_rect = self.draw_register(self.screen_width - 150, 250, 100, 80, "TMP", self.simulator.TMP, 
-                                     self.simulator.control_signals.get('Lb', 0))
-        out_rect = self.draw_register(self.screen_width - 150, 350, 100, 80, "OUT", self.simulator.OUT, 
-                                     self.simulator.control_signals.get('Lo', 0))
+        ir_rect = self.draw_register(self.screen_width - 150, 150, 100, 80, "IR", self.state.IR, 
+                                    self.state.control_signals.get('Li', 0) or 
+                                    self.state.control_signals.get('Ei', 0))
+        tmp_rect = self.draw_register(self.screen_width - 150, 250, 100, 80, "TMP", self.state.TMP, 
+                                     self.state.control_signals.get('Lb', 0))
+        out_rect = self.draw_register(self.screen_width - 150, 350, 100, 80, "OUT", self.state.OUT, 
+                                     self.state.control_signals.get('Lo', 0))
         
         # Bottom panels
         control_rect = self.draw_control_matrix(20, 550, 350, 200)
@@ -720,42 +1121,46 @@ class SAP1Visualizer:
         instr_rect = self.draw_instructions(660, 550, 250, 200)
         
         # Draw connections (simplified)
-        if self.simulator.control_signals.get('Ep', 0):  # PC to bus
+        if self.state.control_signals.get('Ep', 0):  # PC to bus
             pygame.draw.line(screen, RED, 
                             (pc_rect.x + pc_rect.width, pc_rect.y + pc_rect.height // 2),
                             (bus_rect.x, pc_rect.y + pc_rect.height // 2), 2)
         
-        if self.simulator.control_signals.get('Lm', 0):  # Bus to MAR
+        if self.state.control_signals.get('Lm', 0):  # Bus to MAR
             pygame.draw.line(screen, RED, 
                             (bus_rect.x + bus_rect.width, mar_rect.y + mar_rect.height // 2),
                             (mar_rect.x, mar_rect.y + mar_rect.height // 2), 2)
         
-        if self.simulator.control_signals.get('Ei', 0):  # IR to bus
+        if self.state.control_signals.get('Ei', 0):  # IR to bus
             pygame.draw.line(screen, RED, 
                             (ir_rect.x, ir_rect.y + ir_rect.height // 2),
                             (bus_rect.x + bus_rect.width, ir_rect.y + ir_rect.height // 2), 2)
         
-        if self.simulator.control_signals.get('Ea', 0):  # ACC to bus
+        if self.state.control_signals.get('Ea', 0):  # ACC to bus
             pygame.draw.line(screen, RED, 
                             (acc_rect.x + acc_rect.width, acc_rect.y + acc_rect.height // 2),
                             (bus_rect.x, acc_rect.y + acc_rect.height // 2), 2)
         
-        if self.simulator.control_signals.get('Eu', 0):  # ALU to bus
+        if self.state.control_signals.get('Eu', 0):  # ALU to bus
             pygame.draw.line(screen, RED, 
                             (alu_rect.x + alu_rect.width // 2, alu_rect.y),
                             (alu_rect.x + alu_rect.width // 2, bus_rect.y), 2)
         
         # Draw buttons
-        buttons = self.draw_buttons()
+        self.buttons = self.draw_buttons()
+        
+        # Draw the profiler overlay if enabled
+        if self.profiler:
+            self.draw_profiler()
         
         # Draw help if needed
         if self.show_help:
             self.draw_help()
         
-        return buttons
+        return self.buttons
     
-    def handle_events(self):
-        for event in pygame.event.get():
+    def handle_events(self, events=None):
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
                 return False
             
@@ -768,26 +1173,25 @@ class SAP1Visualizer:
                 self.show_help = False
                 return True
             
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_s:
+                    self.worker.send("save")
+                elif event.key == pygame.K_l:
+                    self.worker.send("load")
+                elif event.key == pygame.K_p:
+                    self.toggle_profiler()
+            
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # Left click
-                    mouse_pos = pygame.mouse.get_pos()
+                    mouse_pos = event.pos
                     
-                    # Check button clicks
-                    buttons = self.draw()
-                    for btn_name, btn_rect in buttons:
+                    # Check button clicks against the frame the user clicked on, without redrawing
+                    for btn_name, btn_rect in self.buttons:
                         if btn_rect.collidepoint(mouse_pos):
-                            if btn_name == "step":
-                                self.step_simulation()
-                            elif btn_name == "auto":
-                                self.auto_advance = not self.auto_advance
-                            elif btn_name == "reset":
-                                self.reset_simulation()
-                            elif btn_name == "faster":
-                                self.execution_speed = max(0.1, self.execution_speed * 0.7)
-                            elif btn_name == "slower":
-                                self.execution_speed = min(2.0, self.execution_speed * 1.3)
-                            elif btn_name == "help":
+                            if btn_name == "help":
                                 self.show_help = True
+                            else:
+                                self.worker.send(btn_name)
                     
                     # Check memory scroll
                     mem_rect = pygame.Rect(self.screen_width // 2 - self.scale_value(120), 
@@ -801,71 +1205,131 @@ class SAP1Visualizer:
                             elif mouse_pos[1] > mem_rect.y + mem_rect.height - self.scale_value(30, False):
                                 self.memory_view_start = min(8, self.memory_view_start + 1)
         
-        # Auto-advance if enabled
-        current_time = time.time()
-        if self.auto_advance and current_time - self.last_step_time > self.execution_speed:
-            self.step_simulation()
-            self.last_step_time = current_time
-        
         return True
     
-    def step_simulation(self):
-        if self.simulator.t_state == 0:
-            self.simulator.fetch_cycle()
-        elif self.simulator.t_state == 3:
-            halt = self.simulator.execute_cycle()
-            if halt:
-                self.auto_advance = False
-        elif self.simulator.t_state == 6:
-            self.simulator.t_state = 0
-        else:
-            if self.simulator.t_state < 3:
-                self.simulator.fetch_cycle()
-            else:
-                self.simulator.execute_cycle()
-        
-        # Record execution state
-        state = {
-            'PC': self.simulator.PC,
-            'MAR': self.simulator.MAR,
-            'ACC': self.simulator.ACC,
-            'IR': self.simulator.IR,
-            'TMP': self.simulator.TMP,
-            'OUT': self.simulator.OUT,
-            't_state': self.simulator.t_state,
-            'control_signals': self.simulator.control_signals.copy()
-        }
-        self.execution_history.append(state)
-        
-        self.current_step += 1
-    
-    def reset_simulation(self):
-        self.simulator = SAP1Simulator()
-        self.current_step = 0
-        self.execution_history = []
-        self.auto_advance = False
-    
-    def run(self):
+    def run(self, recorder=None):
         clock = pygame.time.Clock()
         running = True
+        self.worker.start()
         
         while running:
-            running = self.handle_events()
+            start = time.perf_counter()
+            events = pygame.event.get()
+            if recorder:
+                recorder.frame(events)
+            running = self.handle_events(events)
             
             self.draw()
             pygame.display.flip()
+            if self.profiler:
+                self.profiler.end_frame(time.perf_counter() - start)
             clock.tick(60)
         
+        self.worker.send("stop")
+        if recorder:
+            recorder.close()
+        pygame.quit()
+    
+    def replay(self, frames):
+        """Run recorded frames unpaced on one thread; returns frame times and (calls, seconds) per panel"""
+        costs = {}
+        for name in DRAW_METHODS:
+            costs[name] = cost = [0, 0.0]
+            setattr(self, name, timed(getattr(self, name), cost))
+        
+        # The worker's clock follows the recording, so auto-advance steps land on the same frames
+        now = [0.0]
+        self.worker.clock.timer = lambda: now[0]
+        self.worker.clock.restart()
+        frame_times = []
+        for when, events in frames:
+            now[0] = when
+            start = time.perf_counter()
+            running = self.handle_events(events)
+            self.worker.poll()
+            self.draw()
+            pygame.display.flip()
+            frame_times.append(time.perf_counter() - start)
+            if self.profiler:
+                self.profiler.end_frame(frame_times[-1])
+            if not running:
+                break
         pygame.quit()
+        return frame_times, costs
+
+def timed(method, cost):
+    """Wrap method to add its calls and seconds to cost"""
+    def wrapper(*args):
+        start = time.perf_counter()
+        result = method(*args)
+        cost[0] += 1
+        cost[1] += time.perf_counter() - start
+        return result
+    return wrapper
+
+def replay_report(frame_times, costs):
+    """Frame-time percentiles and per-panel costs of a replay"""
+    ordered = sorted(frame_times)
+    count = len(ordered)
+    if not count:
+        print("No frames recorded")
+        return
+    percentiles = ", ".join(f"p{p} {ordered[min(count - 1, count * p // 100)] * 1000:.2f}"
+                            for p in (50, 90, 99))
+    total = sum(ordered)
+    print(f"Replayed {count} frames in {total:.2f}s ({count / total:.0f} fps unpaced)")
+    print(f"Frame time (ms): {percentiles}, max {ordered[-1] * 1000:.2f}")
+    print(f"  {'panel':<20} {'calls':>7} {'ms/frame':>9} {'share':>6}")
+    for name, (calls, seconds) in sorted(costs.items(), key=lambda item: -item[1][1]):
+        print(f"  {name:<20} {calls:>7} {seconds * 1000 / count:>9.3f} {seconds / total:>6.1%}")
 
 # Main function
 def main():
+    parser = argparse.ArgumentParser(description="SAP-1 architecture visualizer")
+    parser.add_argument("--break", dest="breaks", action="append", default=[], metavar="EXPR",
+                        help="stop auto-advance when EXPR is true, e.g. \"ACC > 0x80 and t_state == 6\"")
+    parser.add_argument("--watch", action="append", default=[], metavar="EXPR",
+                        help="stop auto-advance when EXPR changes value, e.g. OUT or mem[0xA]")
+    parser.add_argument("--clock-hz", type=float, default=1.0, metavar="HZ",
+                        help=f"auto-advance steps per second, {MIN_HZ} to {MAX_HZ} (default: 1)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the session's program and input events to PATH")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay a recorded session headless and unpaced, and report frame costs")
+    args = parser.parse_args()
+    if not MIN_HZ <= args.clock_hz <= MAX_HZ:
+        parser.error(f"--clock-hz must be from {MIN_HZ} to {MAX_HZ}")
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+    
+    # A replay takes its program and settings from the recording
+    program = None
+    if args.replay:
+        header, frames = load_session(args.replay)
+        program = header['program']
+        args.clock_hz, args.breaks, args.watch = header['clock_hz'], header['breaks'], header['watch']
+    
     # Create simulator
-    simulator = SAP1Simulator()
+    simulator = SAP1Simulator(program)
+    
+    breakpoints = None
+    if args.breaks or args.watch:
+        from sap1_debug import Breakpoints
+        try:
+            breakpoints = Breakpoints(args.breaks, args.watch, simulator)
+        except ValueError as error:
+            parser.error(str(error))
     
     # Run visualization
-    visualizer = SAP1Visualizer(simulator)
-    visualizer.run()
+    visualizer = SAP1Visualizer(simulator, breakpoints, args.clock_hz)
+    if args.replay:
+        replay_report(*visualizer.replay(frames))
+        return
+    recorder = None
+    if args.record:
+        recorder = SessionRecorder(args.record, simulator,
+                                   {'clock_hz': args.clock_hz, 'breaks': args.breaks, 'watch': args.watch})
+    visualizer.run(recorder)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Cycle mode and instruction mode must end every run in the same architectural state.
+
+    python -m pytest test_fast_mode.py
+"""
+import random
+
+import pytest
+
+from sap1_variants import load_variant
+
+Final = load_variant('final')
+
+SIZES = (16, 32, 64, 256)
+IMAGES_PER_SIZE = 150
+
+
+def random_images(memory_size, count=IMAGES_PER_SIZE):
+    rng = random.Random(memory_size)
+    return [rng.randbytes(memory_size) for _ in range(count)]
+
+
+def final_state(image, memory_size, mode, early_reset, max_instructions):
+    sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False, mode=mode,
+                              early_reset=early_reset, count_accesses=True)
+    sim.load_image(image)
+    halted = sim.run(max_instructions)
+    return {
+        'halted': halted,
+        'registers': (sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT),
+        'memory': bytes(sim.memory),
+        'clock_cycles': sim.clock_cycles,
+        'fetch_counts': list(sim.fetch_counts),
+        'read_counts': list(sim.read_counts),
+    }
+
+
+@pytest.mark.parametrize('early_reset', (False, True))
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_modes_agree(memory_size, early_reset):
+    for index, image in enumerate(random_images(memory_size)):
+        cycle = final_state(image, memory_size, 'cycle', early_reset, 200)
+        fast = final_state(image, memory_size, 'instruction', early_reset, 200)
+        assert cycle == fast, f"image {index}: {image.hex()}"
+
+
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_switching_modes_between_instructions(memory_size):
+    for index, image in enumerate(random_images(memory_size, 30)):
+        reference = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False)
+        reference.load_image(image)
+        mixed = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False)
+        mixed.load_image(image)
+        for step in range(100):
+            mixed.set_mode('instruction' if step % 3 else 'cycle')
+            halted = reference.step_instruction()
+            assert mixed.step_instruction() == halted
+            assert mixed.state_key()[:6] == reference.state_key()[:6], f"image {index} step {step}"
+            if halted:
+                break
@@ -0,0 +1,100 @@
+"""The trace JIT must leave the same machine as fast_step and cycle mode.
+
+    python -m pytest test_jit.py
+"""
+import random
+
+import pytest
+
+from sap1_variants import load_variant
+
+Final = load_variant('final')
+
+SIZES = (16, 32, 64, 256)
+IMAGES_PER_SIZE = 100
+MAX_INSTRUCTIONS = 4096  # A whole number of PC cycles at every size, so a trace ends the run
+
+
+def looping_image(rng, memory_size):
+    """A random image with every HLT turned into OUT, so it wraps around memory forever"""
+    sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False)
+    sim.load_image(rng.randbytes(memory_size))
+    for pc in range(0, memory_size, sim.instruction_bytes):
+        word = sim.read_word(pc)
+        if word >> sim.address_bits == 0xF:
+            sim.write_word(pc, (0xE << sim.address_bits) | (word & sim.address_mask))
+    return bytes(sim.memory)
+
+
+def images(memory_size):
+    rng = random.Random(memory_size)
+    # Mostly looping programs for the JIT to compile, plus some that halt
+    return [looping_image(rng, memory_size) if index % 4 else rng.randbytes(memory_size)
+            for index in range(IMAGES_PER_SIZE)]
+
+
+def run(image, memory_size, max_instructions=MAX_INSTRUCTIONS, **options):
+    sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False,
+                              count_accesses=True, **options)
+    sim.load_image(image)
+    halted = sim.run(max_instructions)
+    return sim, (halted, sim.PC, sim.MAR, sim.IR, sim.ACC, sim.TMP, sim.OUT,
+                 bytes(sim.memory), list(sim.fetch_counts), list(sim.read_counts), sim.last_alu_result)
+
+
+def architectural(state):
+    """Drop last_alu_result, a display aid only cycle mode keeps"""
+    return state[:-1]
+
+
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_jit_matches_fast_step_and_cycle_mode(memory_size):
+    compiled = 0
+    for index, image in enumerate(images(memory_size)):
+        jit, jit_state = run(image, memory_size, mode='instruction', jit=True)
+        _, jit_cycle_state = run(image, memory_size, mode='cycle', jit=True)
+        _, fast_state = run(image, memory_size, mode='instruction')
+        _, cycle_state = run(image, memory_size, mode='cycle')
+        assert jit_state == fast_state, f"image {index}: {image.hex()}"
+        assert jit_cycle_state == cycle_state, f"image {index}: {image.hex()}"
+        assert architectural(fast_state) == architectural(cycle_state), f"image {index}: {image.hex()}"
+        compiled += any(trace is not None for trace in jit.jit_cache.values())
+    # The comparison is only worth something if the traces actually ran
+    assert compiled >= IMAGES_PER_SIZE // 2
+
+
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_budget_cuts_mid_cycle(memory_size):
+    # Budgets that end partway through a PC cycle finish in the interpreter
+    image = images(memory_size)[1]
+    for max_instructions in (1, 7, 100, 101, 128, 1000, 1003, 1024):
+        _, jit_state = run(image, memory_size, max_instructions, mode='instruction', jit=True)
+        _, fast_state = run(image, memory_size, max_instructions, mode='instruction')
+        assert jit_state == fast_state, f"max_instructions {max_instructions}"
+
+
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_hooks_deoptimise(memory_size):
+    for index, image in enumerate(images(memory_size)[:20]):
+        sim = Final.SAP1Simulator(interactive=False, memory_size=memory_size, verbose=False,
+                                  mode='instruction', jit=True, count_accesses=True)
+        sim.load_image(image)
+        seen = []
+        sim.add_hook('after_instruction', lambda machine: seen.append(machine.PC))
+        halted = sim.run(500)
+        _, fast_state = run(image, memory_size, 500, mode='instruction')
+        assert (halted, sim.PC, sim.ACC, sim.OUT, list(sim.fetch_counts)) == \
+            (fast_state[0], fast_state[1], fast_state[4], fast_state[6], fast_state[8]), f"image {index}"
+        # Every instruction reached the hook; none ran inside a trace
+        assert len(seen) == sum(sim.fetch_counts) // sim.instruction_bytes
+        assert not sim.jit_cache
+
+
+@pytest.mark.parametrize('memory_size', SIZES)
+def test_early_reset_deoptimises(memory_size):
+    for index, image in enumerate(images(memory_size)[:20]):
+        jit, jit_state = run(image, memory_size, 500, mode='instruction', jit=True, early_reset=True)
+        cycle, cycle_state = run(image, memory_size, 500, mode='cycle', early_reset=True)
+        assert architectural(jit_state) == architectural(cycle_state), f"image {index}"
+        assert jit.clock_cycles == cycle.clock_cycles
+        assert not jit.jit_cache